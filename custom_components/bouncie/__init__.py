@@ -1,29 +1,70 @@
 """The Bouncie integration."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
 from logging import getLogger
+from typing import Any, Coroutine
 
+from homeassistant.components import persistent_notification, webhook
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.config_entry_oauth2_flow import DATA_IMPLEMENTATIONS
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType
 
 from .api import BouncieAPI, BouncieSession
 from .common import (
     BouncieOAuth2Implementation,
     BouncieVehiclesDataUpdateCoordinator,
-    BouncieWebhookRequestView,
+    BouncieWebhookHandler,
     valid_external_url,
 )
 from .config_flow import BouncieOAuth2FlowHandler
 from .const import (
     API,
+    ATTR_EVENT,
+    ATTR_VIN,
     CONF_API_KEY,
+    CONF_BUS_EVENTS,
     CONF_CLIENT_ID,
     CONF_CLIENT_SECRET,
+    CONF_COALESCE_WINDOW,
+    CONF_METRICS,
+    CONF_PATH_MAX_GAP,
+    CONF_PATH_TOLERANCE,
+    CONF_QUEUE_OVERFLOW,
+    CONF_QUEUE_SIZE,
+    CONF_QUEUE_WORKERS,
+    CONF_WEBHOOK_ID,
+    DEFAULT_BUS_EVENTS,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_METRICS,
+    DEFAULT_PATH_MAX_GAP,
+    DEFAULT_PATH_TOLERANCE,
+    DEFAULT_QUEUE_OVERFLOW,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_QUEUE_WORKERS,
     DOMAIN,
+    EVENT_TRIPEND,
+    METRICS,
+    NAME,
     OAUTH2_AUTHORIZE,
     OAUTH2_TOKEN,
+    OPTIONS,
     PLATFORMS,
+    SCHEDULER,
+    STORAGE_VERSION,
+    TASKS,
+    TRIP_STORE,
+    TRIPS_SYNC_INTERVAL,
     VEHICLES_COORDINATOR,
+    WEBHOOK_QUEUE,
 )
+from .dispatcher import BouncieWebhookDispatcher, BouncieWebhookQueue
+from .metrics import NO_METRICS, BouncieMetrics
+from .trips import BouncieTripStore, PathSimplifier
 
 _LOGGER = getLogger(__name__)
 
@@ -40,7 +81,11 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up Bouncie from a config entry."""
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN].setdefault(entry.entry_id, {})
-    hass.data[DOMAIN].setdefault(CONF_CLIENT_ID, set())
+    # The options the entry was set up with, to tell option from data updates
+    hass.data[DOMAIN][entry.entry_id][OPTIONS] = dict(entry.options)
+    hass.data[DOMAIN][entry.entry_id][TASKS] = set()
+    if CONF_WEBHOOK_ID not in entry.data:
+        _async_create_webhook_id(hass, entry)
 
     implementation = BouncieOAuth2Implementation(
         hass,
@@ -52,15 +97,83 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         OAUTH2_TOKEN,
     )
     BouncieOAuth2FlowHandler.async_register_implementation(hass, implementation)
-    api = BouncieAPI(BouncieSession(hass, entry, implementation))
-    vehicles_coordinator = BouncieVehiclesDataUpdateCoordinator(hass, api)
-    await vehicles_coordinator.async_refresh()
+    metrics = (
+        BouncieMetrics()
+        if entry.options.get(CONF_METRICS, DEFAULT_METRICS)
+        else NO_METRICS
+    )
+    hass.data[DOMAIN][entry.entry_id][METRICS] = metrics
+    api = BouncieAPI(BouncieSession(hass, entry, implementation), metrics)
+    dispatcher = BouncieWebhookDispatcher(
+        hass,
+        entry.entry_id,
+        entry.options.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW),
+        metrics,
+        entry.options.get(CONF_BUS_EVENTS, DEFAULT_BUS_EVENTS),
+    )
+    if path_tolerance := entry.options.get(CONF_PATH_TOLERANCE, DEFAULT_PATH_TOLERANCE):
+        dispatcher.trip_buffer.simplifier = PathSimplifier(
+            path_tolerance,
+            entry.options.get(CONF_PATH_MAX_GAP, DEFAULT_PATH_MAX_GAP),
+        )
+    vehicles_coordinator = BouncieVehiclesDataUpdateCoordinator(
+        hass, api, dispatcher, entry
+    )
+    # Create entities from the last known vehicles and refresh in the background
+    if await vehicles_coordinator.async_load_snapshot():
+        _async_create_entry_task(hass, entry, vehicles_coordinator.async_refresh())
+    else:
+        await vehicles_coordinator.async_refresh()
     hass.data[DOMAIN][entry.entry_id][API] = api
     hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR] = vehicles_coordinator
-    hass.data[DOMAIN][CONF_CLIENT_ID].add(entry.data[CONF_CLIENT_ID])
 
-    # Register view
-    hass.http.register_view(BouncieWebhookRequestView())
+    # Webhooks are queued by the handler and dispatched by the workers
+    webhook_queue = BouncieWebhookQueue(
+        hass,
+        dispatcher.async_handle_webhook,
+        entry.options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+        entry.options.get(CONF_QUEUE_WORKERS, DEFAULT_QUEUE_WORKERS),
+        entry.options.get(CONF_QUEUE_OVERFLOW, DEFAULT_QUEUE_OVERFLOW),
+    )
+    hass.data[DOMAIN][entry.entry_id][WEBHOOK_QUEUE] = webhook_queue
+    _async_start_webhook(hass, entry)
+
+    # Trip history
+    trip_store = BouncieTripStore(hass, entry.entry_id, api)
+    await trip_store.async_load()
+    hass.data[DOMAIN][entry.entry_id][TRIP_STORE] = trip_store
+    for vin, aggregate in trip_store.aggregates().items():
+        dispatcher.trip_buffer.aggregates.setdefault(vin, aggregate)
+
+    @callback
+    def _async_save_trip(status: dict[str, Any]) -> None:
+        """Save the totals of a trip when it ends."""
+        if status[ATTR_EVENT] != EVENT_TRIPEND:
+            return
+        aggregate = dispatcher.trip_buffer.aggregates.get(status[ATTR_VIN])
+        if aggregate is not None and aggregate.finished:
+            trip_store.async_save_aggregate(status[ATTR_VIN], aggregate)
+
+    entry.async_on_unload(dispatcher.async_add_stage(_async_save_trip))
+
+    async def _async_sync_trips() -> None:
+        """Sync the trips of all vehicles."""
+        for vehicle in (vehicles_coordinator.data or {}).values():
+            # Trips are requested by the IMEI of the device in the vehicle
+            if vehicle.imei is not None:
+                await trip_store.async_sync(vehicle.imei)
+
+    @callback
+    def _async_start_sync_trips(_: datetime | None = None) -> None:
+        """Start a sync that is cancelled when the entry unloads."""
+        _async_create_entry_task(hass, entry, _async_sync_trips())
+
+    entry.async_on_unload(
+        async_track_time_interval(hass, _async_start_sync_trips, TRIPS_SYNC_INTERVAL)
+    )
+    _async_start_sync_trips()
+
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
     for platform in PLATFORMS:
         hass.async_create_task(
@@ -70,8 +183,91 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     return True
 
 
+@callback
+def _async_create_entry_task(
+    hass: HomeAssistant, entry: ConfigEntry, target: Coroutine[Any, Any, Any]
+) -> None:
+    """Run target in the background until it is done or the entry unloads."""
+    tasks: set[asyncio.Task] = hass.data[DOMAIN][entry.entry_id][TASKS]
+    task = hass.async_create_task(target)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+@callback
+def _async_start_webhook(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Start the queue workers and receive the webhooks of the entry."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    webhook_queue: BouncieWebhookQueue = entry_data[WEBHOOK_QUEUE]
+    webhook_queue.async_start()
+    webhook.async_register(
+        hass,
+        DOMAIN,
+        entry.title,
+        entry.data[CONF_WEBHOOK_ID],
+        BouncieWebhookHandler(
+            entry, webhook_queue, entry_data[METRICS]
+        ).async_handle_webhook,
+    )
+
+
+@callback
+def _async_create_webhook_id(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Give the entry its own webhook ID and tell the user where to point Bouncie."""
+    webhook_id = webhook.async_generate_id()
+    hass.config_entries.async_update_entry(
+        entry, data={**entry.data, CONF_WEBHOOK_ID: webhook_id}
+    )
+    persistent_notification.async_create(
+        hass,
+        f"Set the webhook URL of your Bouncie application {entry.data[CONF_CLIENT_ID]} "
+        f"to {webhook.async_generate_url(hass, webhook_id)}",
+        title=NAME,
+        notification_id=f"{DOMAIN}_{entry.entry_id}_webhook",
+    )
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    # Data updates such as token refreshes call the listener as well
+    if entry.options == hass.data[DOMAIN][entry.entry_id][OPTIONS]:
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     """Unload a config entry."""
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    # Handle the acknowledged webhooks while the entities are still there
+    webhook.async_unregister(hass, config_entry.data[CONF_WEBHOOK_ID])
+    await entry_data[WEBHOOK_QUEUE].async_stop()
+    entry_data[VEHICLES_COORDINATOR].dispatcher.async_stop()
+
+    if not await hass.config_entries.async_unload_platforms(config_entry, PLATFORMS):
+        # The entry stays loaded, keep receiving its webhooks
+        _async_start_webhook(hass, config_entry)
+        return False
+
     hass.data[DOMAIN].pop(config_entry.entry_id)
+    for task in entry_data[TASKS]:
+        task.cancel()
+    await asyncio.gather(*entry_data[TASKS], return_exceptions=True)
+    await entry_data[VEHICLES_COORDINATOR].async_shutdown()
+    await entry_data[TRIP_STORE].async_flush()
+    # The flow registers the implementation again on reauth
+    hass.data.get(DATA_IMPLEMENTATIONS, {}).get(DOMAIN, {}).pop(
+        config_entry.data[CONF_CLIENT_ID], None
+    )
+    # Drop the shared scheduler with the last entry
+    if not entry_data[API].scheduler.entries:
+        hass.data[DOMAIN].pop(SCHEDULER, None)
 
     return True
+
+
+async def async_remove_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+    """Remove the stored vehicles and trip history of a removed entry."""
+    for name in ("vehicles", "trips"):
+        await Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{config_entry.entry_id}.{name}"
+        ).async_remove()
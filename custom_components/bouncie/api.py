@@ -1,19 +1,129 @@
 """API for Bouncie API bound to Home Assistant OAuth."""
+import asyncio
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from hashlib import blake2b
+from http import HTTPStatus
+import json
 import logging
-from typing import Any, Dict, List
+import random
+from time import time
+from typing import Any, AsyncIterator, Dict, List, Mapping, NamedTuple, Optional, Tuple
 
-from aiohttp import client
+from aiohttp import ClientConnectionError, ClientError, ClientTimeout, client
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.config_entry_oauth2_flow import OAuth2Session
+from homeassistant.helpers.config_entry_oauth2_flow import (
+    AbstractOAuth2Implementation,
+    OAuth2Session,
+)
+from homeassistant.util import dt
 
-from .const import USER_URL, VEHICLES_URL
+from .const import (
+    ATTR_TRANSACTION_ID,
+    REQUEST_BACKOFF,
+    REQUEST_BACKOFF_MAX,
+    REQUEST_CHUNK_SIZE,
+    REQUEST_MAX_BODY,
+    REQUEST_RETRIES,
+    REQUEST_TIMEOUT,
+    TOKEN_REFRESH_MARGIN,
+    TRIPS_MAX_WINDOW,
+    TRIPS_SYNC_OVERLAP,
+    TRIPS_URL,
+    USER_URL,
+    VEHICLES_URL,
+)
+from .metrics import NO_METRICS, BouncieMetrics
+from .scheduler import async_get_scheduler
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
+RETRY_STATUSES = {
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+
+
+class CachedResponse(NamedTuple):
+    """Parsed response of a conditional request and its validators."""
+
+    fingerprint: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    data: Any
+
+
+def fingerprint(body: bytes) -> str:
+    """Return a digest that identifies a response body."""
+    return blake2b(body, digest_size=16).hexdigest()
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Return the delay requested by a Retry-After header."""
+    if (value := headers.get("Retry-After")) is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - dt.utcnow()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+async def _async_read_body(resp: client.ClientResponse) -> bytearray:
+    """Read a response body in chunks."""
+    body = bytearray()
+    async for chunk in resp.content.iter_chunked(REQUEST_CHUNK_SIZE):
+        body.extend(chunk)
+        if len(body) > REQUEST_MAX_BODY:
+            raise ValueError(f"Response body exceeds {REQUEST_MAX_BODY} bytes")
+    return body
+
 
 class BouncieSession(OAuth2Session):
     """Bouncie specific session to make requests authenticated with OAuth2."""
 
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry: ConfigEntry,
+        implementation: AbstractOAuth2Implementation,
+    ) -> None:
+        """Initialize."""
+        super().__init__(hass, config_entry, implementation)
+        # Only one refresh runs at a time, waiting requests use its token
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def fresh_token(self) -> bool:
+        """Return if the token does not need a refresh yet."""
+        return float(self.token["expires_at"]) > time() + TOKEN_REFRESH_MARGIN
+
+    async def async_ensure_token_valid(self) -> None:
+        """Refresh the token ahead of expiry, one refresh at a time."""
+        if self.fresh_token:
+            return
+        async with self._refresh_lock:
+            if self.fresh_token:
+                return
+            try:
+                new_token = await self.implementation.async_refresh_token(self.token)
+            except ClientError as err:
+                if not self.valid_token:
+                    raise
+                _LOGGER.debug("Unable to refresh token ahead of expiry: %s", err)
+                return
+            self.hass.config_entries.async_update_entry(
+                self.config_entry, data={**self.config_entry.data, "token": new_token}
+            )
+
     async def async_request(
         self, method: str, url: str, **kwargs: Any
     ) -> client.ClientResponse:
@@ -35,22 +145,173 @@ class BouncieSession(OAuth2Session):
 class BouncieAPI:
     """Provide Bouncie authentication tied to an OAuth2 based config entry."""
 
-    def __init__(self, oauth_session: BouncieSession) -> None:
+    def __init__(
+        self, oauth_session: BouncieSession, metrics: BouncieMetrics = NO_METRICS
+    ) -> None:
         """Bouncie API Client."""
         self._oauth_session: BouncieSession = oauth_session
+        self.metrics = metrics
+        self.scheduler = async_get_scheduler(oauth_session.hass)
+        self.entry_id: str = oauth_session.config_entry.entry_id
+        implementation = oauth_session.implementation
+        self._rate_limiter = self.scheduler.rate_limiter(
+            getattr(implementation, "api_key", implementation.client_id)
+        )
+        self._in_flight: Dict[Tuple[str, Tuple[Any, ...]], asyncio.Task] = {}
+        self._cache: Dict[Tuple[str, Tuple[Any, ...]], CachedResponse] = {}
+
+    async def _async_get(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        conditional: bool = False,
+    ) -> Any:
+        """Make a GET request, identical concurrent requests share the response."""
+        key = (url, tuple(sorted((params or {}).items())))
+        if (task := self._in_flight.get(key)) is None:
+            task = self._in_flight[key] = self._oauth_session.hass.async_create_task(
+                self._async_get_json(key, url, params, conditional)
+            )
+
+            def _done(_: asyncio.Task) -> None:
+                self._in_flight.pop(key, None)
+                if not task.cancelled():
+                    # Mark the error retrieved when every caller gave up
+                    task.exception()
+
+            task.add_done_callback(_done)
+        else:
+            self.metrics.increment("api_requests_shared")
+        # A cancelled caller does not cancel the request of the others
+        return await asyncio.shield(task)
+
+    async def _async_get_json(
+        self,
+        key: Tuple[str, Tuple[Any, ...]],
+        url: str,
+        params: Optional[Dict[str, str]],
+        conditional: bool,
+    ) -> Any:
+        """Get a JSON response.
+
+        Conditional requests return the previous response object while the
+        response is unchanged.
+        """
+        cached = self._cache.get(key) if conditional else None
+        headers = {}
+        if cached is not None and cached.etag is not None:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified is not None:
+            headers["If-Modified-Since"] = cached.last_modified
+        status, resp_headers, body = await self._async_request(
+            "get", url, params=params, headers=headers
+        )
+        if cached is not None and status == HTTPStatus.NOT_MODIFIED:
+            self.metrics.increment("api_not_modified")
+            return cached.data
+        if not conditional:
+            return json.loads(body)
+        digest = fingerprint(body)
+        if cached is not None and cached.fingerprint == digest:
+            self.metrics.increment("api_unchanged")
+            data = cached.data
+        else:
+            data = json.loads(body)
+        self._cache[key] = CachedResponse(
+            digest, resp_headers.get("ETag"), resp_headers.get("Last-Modified"), data
+        )
+        return data
+
+    async def _async_request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> Tuple[int, Mapping[str, str], bytearray]:
+        """Make a rate limited request, retry on throttling and server errors.
+
+        Return the status, headers and body of the response.
+        """
+        for attempt in range(REQUEST_RETRIES + 1):
+            retry_after = None
+            # Retries wait outside of the slot so other entries can go ahead
+            async with self.scheduler.async_request_slot(self.entry_id):
+                await self._rate_limiter.async_acquire()
+                self.metrics.increment("api_requests")
+                try:
+                    with self.metrics.time("api_request"):
+                        resp = await self._oauth_session.async_request(
+                            method,
+                            url,
+                            timeout=ClientTimeout(total=REQUEST_TIMEOUT),
+                            **kwargs,
+                        )
+                except (ClientConnectionError, asyncio.TimeoutError) as err:
+                    self.metrics.increment(f"api_errors.{type(err).__name__}")
+                    if attempt == REQUEST_RETRIES:
+                        raise
+                    _LOGGER.debug("Request to %s failed, retrying: %s", url, err)
+                else:
+                    try:
+                        if resp.status >= HTTPStatus.BAD_REQUEST:
+                            self.metrics.increment(f"api_errors.http_{resp.status}")
+                        if (
+                            resp.status not in RETRY_STATUSES
+                            or attempt == REQUEST_RETRIES
+                        ):
+                            resp.raise_for_status()
+                            body = await _async_read_body(resp)
+                            self.metrics.increment("api_bytes", len(body))
+                            return resp.status, resp.headers, body
+                        retry_after = _retry_after(resp.headers)
+                        _LOGGER.debug(
+                            "Request to %s returned %s, retrying", url, resp.status
+                        )
+                    finally:
+                        resp.release()
+
+            if retry_after is None:
+                retry_after = random.uniform(
+                    0, min(REQUEST_BACKOFF_MAX, REQUEST_BACKOFF * 2**attempt)
+                )
+            await asyncio.sleep(min(retry_after, REQUEST_BACKOFF_MAX))
 
     async def async_get_user(self) -> Dict[str, Any]:
         """Get associated user information."""
-        resp = await self._oauth_session.async_request(
-            "get", USER_URL, raise_for_status=True
-        )
-        return await resp.json()
+        return await self._async_get(USER_URL)
 
     async def async_get_vehicles(self) -> List[Dict[str, Any]]:
-        """Get associated vehicles."""
-        resp = await self._oauth_session.async_request(
-            "get",
-            VEHICLES_URL,
-            raise_for_status=True,
-        )
-        return await resp.json()
+        """Get associated vehicles, the same list while the response is unchanged."""
+        return await self._async_get(VEHICLES_URL, conditional=True)
+
+    async def async_get_trips(
+        self, imei: str, start: datetime, end: datetime
+    ) -> List[Dict[str, Any]]:
+        """Get the trips of a device that started between start and end."""
+        trips: Dict[str, Dict[str, Any]] = {}
+        async for _, window_trips in self.async_iter_trips(imei, start, end):
+            for trip in window_trips:
+                trips[trip[ATTR_TRANSACTION_ID]] = trip
+        return list(trips.values())
+
+    async def async_iter_trips(
+        self, imei: str, start: datetime, end: datetime
+    ) -> AsyncIterator[tuple[datetime, List[Dict[str, Any]]]]:
+        """Get trips in windows the API accepts, yield each window end and trips.
+
+        Trips have to end before the end of a window, so the next window
+        starts TRIPS_SYNC_OVERLAP earlier to fetch the trips that cross it.
+        A trip can be yielded twice, callers keep them by transaction ID.
+        """
+        while start < end:
+            window_end = min(start + TRIPS_MAX_WINDOW, end)
+            trips = await self._async_get(
+                TRIPS_URL,
+                params={
+                    "imei": imei,
+                    "gps-format": "polyline",
+                    "starts-after": dt.as_utc(start).isoformat(),
+                    "ends-before": dt.as_utc(window_end).isoformat(),
+                },
+            )
+            yield window_end, trips
+            if window_end >= end:
+                return
+            start = window_end - TRIPS_SYNC_OVERLAP
@@ -1,28 +1,121 @@
 """Common classes and functions for Bouncie."""
+from __future__ import annotations
+
+from datetime import timedelta
 from http import HTTPStatus
+import json
 from logging import getLogger
+from time import monotonic
 from typing import Any
 
 from aiohttp.web import Request, Response
-from homeassistant.components.http.view import HomeAssistantView
-from homeassistant.core import HomeAssistant
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.helpers import config_entry_oauth2_flow
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.network import NoURLAvailableError, get_url
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .api import BouncieAPI
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from .api import BouncieAPI, fingerprint
 from .const import (
+    ATTR_ENTRY_ID,
+    ATTR_EVENT,
+    ATTR_IMEI,
     ATTR_VIN,
-    BOUNCIE_EVENT,
     CONF_CLIENT_ID,
+    CONF_POLL_CEILING,
+    CONF_POLL_FLOOR,
+    CONF_WEBHOOK_MAX_SIZE,
+    DEFAULT_POLL_CEILING,
+    DEFAULT_POLL_FLOOR,
+    DEFAULT_WEBHOOK_MAX_SIZE,
     DOMAIN,
-    HA_URL,
+    EVENT_TRIPDATA,
+    EVENT_TRIPEND,
+    EVENT_TRIPMETRICS,
+    EVENT_TRIPSTART,
+    REQUEST_CHUNK_SIZE,
+    STORAGE_VERSION,
     UPDATE_INTERVAL,
-    WEBHOOK_RESPONSE_SCHEMA,
+    WEBHOOK_FRESHNESS,
+    WEBHOOK_LOG_BODY,
+    WEBHOOK_LOG_INTERVAL,
+    WEBHOOK_REQUIRED_KEYS,
 )
+from .dispatcher import BouncieWebhookDispatcher, BouncieWebhookQueue, parse_timestamp
+from .metrics import BouncieMetrics
+from .models import VehicleLocation, VehicleState
 
 _LOGGER = getLogger(__name__)
 
+SAVE_DELAY = 10
+
+
+def _parse_vehicles(data: list[dict[str, Any]]) -> dict[str, VehicleState]:
+    """Return the vehicles of the API by VIN, skipping vehicles without a VIN."""
+    return {
+        state.vin: state for state in map(VehicleState.from_dict, _valid_vehicles(data))
+    }
+
+
+def _valid_vehicles(data: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Return the vehicles that have a VIN."""
+    vehicles = []
+    for vehicle in data:
+        if not vehicle.get(ATTR_VIN):
+            _LOGGER.warning("Skipping vehicle without VIN: %s", vehicle.get(ATTR_IMEI))
+            continue
+        vehicles.append(vehicle)
+    return vehicles
+
+
+def parse_webhook(body: bytes) -> dict[str, Any]:
+    """Parse a webhook body and check the keys every event carries."""
+    data = orjson.loads(body) if orjson is not None else json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    for key in WEBHOOK_REQUIRED_KEYS:
+        if (value := data.get(key)) is None:
+            raise ValueError(f"Missing required key {key}")
+        if not isinstance(value, str):
+            data[key] = str(value)
+    return data
+
+
+def truncate(body: bytes) -> str:
+    """Return the start of a body for logging."""
+    text = body[:WEBHOOK_LOG_BODY].decode(errors="replace")
+    return f"{text}..." if len(body) > WEBHOOK_LOG_BODY else text
+
+
+class ThrottledLogger:
+    """Log a warning at most once per interval, count the ones skipped."""
+
+    def __init__(self, interval: float) -> None:
+        """Initialize."""
+        self.interval = interval
+        self.suppressed: int = 0
+        self._next: float = 0.0
+
+    def warning(self, msg: str, *args: Any) -> None:
+        """Log a warning unless one was logged recently."""
+        now = monotonic()
+        if now < self._next:
+            self.suppressed += 1
+            return
+        self._next = now + self.interval
+        if self.suppressed:
+            msg = f"{msg} (%s similar messages suppressed)"
+            args = (*args, self.suppressed)
+            self.suppressed = 0
+        _LOGGER.warning(msg, *args)
+
 
 def valid_external_url(hass: HomeAssistant) -> bool:
     """Return whether a valid external URL for HA is available."""
@@ -108,40 +201,75 @@ class BouncieOAuth2Implementation(config_entry_oauth2_flow.LocalOAuth2Implementa
         return {**token, **new_token}
 
 
-class BouncieWebhookRequestView(HomeAssistantView):
-    """Provide a page for the device to call."""
+class BouncieWebhookHandler:
+    """Receive the webhooks of one config entry on its own webhook ID."""
 
-    requires_auth = False
-    cors_allowed = True
-    url = HA_URL
-    name = HA_URL[1:].replace("/", ":")
+    def __init__(
+        self,
+        entry: ConfigEntry,
+        queue: BouncieWebhookQueue,
+        metrics: BouncieMetrics,
+    ) -> None:
+        """Initialize."""
+        self.client_id: str = entry.data[CONF_CLIENT_ID]
+        self.entry_id = entry.entry_id
+        self.max_size: int = (
+            entry.options.get(CONF_WEBHOOK_MAX_SIZE, DEFAULT_WEBHOOK_MAX_SIZE) * 1024
+        )
+        self.queue = queue
+        self.metrics = metrics
+        # Per entry, so a noisy account does not hide the warnings of another
+        self._invalid_logger = ThrottledLogger(WEBHOOK_LOG_INTERVAL)
+        self._unauthorized_logger = ThrottledLogger(WEBHOOK_LOG_INTERVAL)
 
-    async def post(self, request: Request) -> Response:
-        """Respond to requests from the device."""
-        hass: HomeAssistant = request.app["hass"]
-        implementations: dict[
-            str, Any
-        ] = await config_entry_oauth2_flow.async_get_implementations(hass, DOMAIN)
-        client_id: str = request.headers.get("Authorization")
+    @staticmethod
+    async def _async_read_body(request: Request, max_size: int) -> bytes | None:
+        """Read the request body, None if it is larger than max_size."""
+        if request.content_length is not None and request.content_length > max_size:
+            return None
+        body = bytearray()
+        async for chunk in request.content.iter_chunked(REQUEST_CHUNK_SIZE):
+            body.extend(chunk)
+            if len(body) > max_size:
+                return None
+        return bytes(body)
 
-        if client_id and client_id in implementations.keys():
-            try:
-                data = await request.json()
-                status = WEBHOOK_RESPONSE_SCHEMA(data)
-                hass.bus.async_fire(
-                    f"{BOUNCIE_EVENT}", {**status, CONF_CLIENT_ID: client_id}
-                )
-            except Exception as err:  # pylint: disable=broad-except
-                _LOGGER.warning(
-                    "Received authorized event but unable to parse: %s (%s)",
-                    await request.text(),
-                    err,
-                )
+    async def _async_queue_webhook(self, request: Request) -> None:
+        """Queue the event of an authorized webhook."""
+        if (body := await self._async_read_body(request, self.max_size)) is None:
+            self.metrics.increment("webhook_errors.too_large")
+            self._invalid_logger.warning(
+                "Received authorized event larger than %s kB", self.max_size // 1024
+            )
+            return
+        self.metrics.increment("webhook_bytes", len(body))
+        try:
+            status = parse_webhook(body)
+        except ValueError as err:
+            self.metrics.increment("webhook_errors.invalid")
+            self._invalid_logger.warning(
+                "Received authorized event but unable to parse: %s (%s)",
+                truncate(body),
+                err,
+            )
+            return
+        # Acknowledge right away, the event is handled in the background
+        self.queue.async_put({**status, ATTR_ENTRY_ID: self.entry_id})
+
+    async def async_handle_webhook(
+        self, hass: HomeAssistant, webhook_id: str, request: Request
+    ) -> Response:
+        """Respond to requests from the device."""
+        if request.headers.get("Authorization") == self.client_id:
+            self.metrics.increment("webhooks")
+            with self.metrics.time("webhook"):
+                await self._async_queue_webhook(request)
             return Response(status=HTTPStatus.OK)
 
-        _LOGGER.warning(
+        self.metrics.increment("webhook_errors.unauthorized")
+        self._unauthorized_logger.warning(
             "Received unauthorized request: %s (Headers: %s)",
-            await request.text(),
+            truncate(await request.content.read(WEBHOOK_LOG_BODY + 1)),
             request.headers,
         )
         return Response(status=HTTPStatus.OK)
@@ -150,21 +278,302 @@ class BouncieWebhookRequestView(HomeAssistantView):
 class BouncieVehiclesDataUpdateCoordinator(DataUpdateCoordinator):
     """Define an object to hold Bouncie user profile data."""
 
-    def __init__(self, hass: HomeAssistant, api: BouncieAPI) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        api: BouncieAPI,
+        dispatcher: BouncieWebhookDispatcher,
+        entry: ConfigEntry,
+    ) -> None:
         """Initialize."""
+        self.poll_floor = timedelta(
+            minutes=entry.options.get(CONF_POLL_FLOOR, DEFAULT_POLL_FLOOR)
+        )
+        self.poll_ceiling = max(
+            self.poll_floor,
+            timedelta(
+                minutes=entry.options.get(CONF_POLL_CEILING, DEFAULT_POLL_CEILING)
+            ),
+        )
+        self._backoff = min(max(UPDATE_INTERVAL, self.poll_floor), self.poll_ceiling)
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=UPDATE_INTERVAL,
+            update_interval=self._backoff,
             update_method=self._async_update_data,
         )
         self.api = api
+        self.dispatcher = dispatcher
+        self.metrics = api.metrics
+        self._store = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.vehicles"
+        )
+        self._save_pending: bool = False
+        # Time of the last trip event per VIN of the vehicles on a trip
+        self._trips_active: dict[str, float] = {}
+        self._last_webhook: float | None = None
+        self._webhook_since_update: bool = False
+        self._unsub_resume: CALLBACK_TYPE | None = None
+        self._unsub_stage = dispatcher.async_add_stage(self._async_handle_event)
+        # Polls of all entries share the scheduler, entries with trips go first
+        self._entry_id = entry.entry_id
+        self._unsub_scheduler = api.scheduler.async_register(
+            entry.entry_id, self.has_active_trips
+        )
+        # Time of the newest value per VIN and stats field received by webhook
+        self._patched: dict[str, dict[str, float]] = {}
+        # Last vehicles response and the digest of every vehicle record in it
+        self._response: list[dict[str, Any]] | None = None
+        self._fingerprints: dict[str, str] = {}
+        self._changed_vins: set[str] = set()
+        self._vin_listeners: dict[str, list[CALLBACK_TYPE]] = {}
+
+    def has_active_trips(self) -> bool:
+        """Return if a vehicle of this entry is on a trip."""
+        return bool(self._trips_active)
+
+    @property
+    def effective_interval(self) -> timedelta | None:
+        """Return the current polling interval, None while polling is paused."""
+        return self.update_interval
+
+    @callback
+    def async_add_vin_listener(
+        self, vin: str, update_callback: CALLBACK_TYPE
+    ) -> CALLBACK_TYPE:
+        """Listen for updates of a single vehicle."""
+        self._vin_listeners.setdefault(vin, []).append(update_callback)
+
+        @callback
+        def _async_remove_listener() -> None:
+            listeners = self._vin_listeners[vin]
+            listeners.remove(update_callback)
+            if not listeners:
+                del self._vin_listeners[vin]
+
+        return _async_remove_listener
+
+    async def _async_refresh(self, *args: Any, **kwargs: Any) -> None:
+        """Refresh the data, then notify the listeners of the vehicles that changed."""
+        # Scheduled and requested refreshes all end up here
+        await super()._async_refresh(*args, **kwargs)
+        changed, self._changed_vins = self._changed_vins, set()
+        self.async_update_vins(changed)
+
+    @callback
+    def async_update_vins(self, vins: set[str]) -> None:
+        """Notify the listeners of the given vehicles."""
+        for vin in vins:
+            for update_callback in tuple(self._vin_listeners.get(vin, ())):
+                update_callback()
+
+    @callback
+    def _async_handle_event(self, status: dict[str, Any]) -> None:
+        """Apply a webhook event and adapt the polling interval."""
+        vin = status[ATTR_VIN]
+        event_type = status[ATTR_EVENT]
+        if event_type == EVENT_TRIPEND:
+            self._trips_active.pop(vin, None)
+        elif event_type in (EVENT_TRIPSTART, EVENT_TRIPDATA, EVENT_TRIPMETRICS):
+            self._trips_active[vin] = monotonic()
+
+        if event_type == EVENT_TRIPSTART:
+            self._async_patch_odometer(vin, status.get("start"))
+        elif event_type == EVENT_TRIPEND:
+            self._async_patch_odometer(vin, status.get("end"))
+            if vin in self.dispatcher.trip_buffer:
+                # The simplified path ends where the vehicle was parked
+                trip = self.dispatcher.trip_buffer[vin]
+                if trip.path_last is not None and trip.last_position is not None:
+                    self._async_patch_stats(
+                        vin,
+                        {"location": VehicleLocation(*trip.last_position)},
+                        trip.timestamp[-1],
+                    )
+        elif event_type == EVENT_TRIPDATA and vin in self.dispatcher.trip_buffer:
+            trip = self.dispatcher.trip_buffer[vin]
+            patch: dict[str, Any] = {}
+            if (point := trip.path_last) is not None:
+                # Only move along the points kept by the path simplifier
+                self._async_patch_stats(
+                    vin,
+                    {"location": VehicleLocation(point.lat, point.lon)},
+                    point.timestamp,
+                )
+            elif trip.last_position is not None:
+                patch["location"] = VehicleLocation(*trip.last_position)
+            if trip.last_speed is not None:
+                patch["speed"] = trip.last_speed
+            if trip.last_fuel is not None:
+                patch["fuel_level"] = trip.last_fuel
+            if patch:
+                self._async_patch_stats(vin, patch, trip.timestamp[-1])
+
+        if event_type in (EVENT_TRIPDATA, EVENT_TRIPMETRICS, EVENT_TRIPEND):
+            self._last_webhook = monotonic()
+        self._webhook_since_update = True
+        self._backoff = self.poll_floor
+        self._async_adapt_interval()
 
-    async def _async_update_data(self) -> dict[str, dict[str, Any]]:
+    @callback
+    def _async_patch_odometer(self, vin: str, trip: dict[str, Any] | None) -> None:
+        """Patch the odometer from the start or end of a trip."""
+        if trip and (odometer := trip.get("odometer")) is not None:
+            self._async_patch_stats(
+                vin, {"odometer": odometer}, parse_timestamp(trip.get("timestamp"))
+            )
+
+    @callback
+    def _async_patch_stats(
+        self, vin: str, patch: dict[str, Any], timestamp: float
+    ) -> None:
+        """Merge newer values into the stats of a vehicle, the newest value wins."""
+        if not self.data or (vehicle := self.data.get(vin)) is None:
+            return
+        stats = vehicle.stats
+        patched = self._patched.setdefault(vin, {})
+        polled = stats.updated_at
+        changed = False
+        for key, value in patch.items():
+            if timestamp < patched.get(key, polled):
+                continue
+            patched[key] = timestamp
+            if getattr(stats, key) != value:
+                setattr(stats, key, value)
+                changed = True
+        if changed:
+            self.async_update_vins({vin})
+
+    def _merge_patched(self, vehicles: dict[str, VehicleState]) -> None:
+        """Keep webhook values that are newer than the polled stats."""
+        for vin, patched in self._patched.items():
+            if (vehicle := vehicles.get(vin)) is None or vin not in (self.data or {}):
+                continue
+            stats = vehicle.stats
+            previous = self.data[vin].stats
+            polled = stats.updated_at
+            for key, timestamp in list(patched.items()):
+                if timestamp > polled and (value := getattr(previous, key)) is not None:
+                    setattr(stats, key, value)
+                else:
+                    del patched[key]
+
+    @callback
+    def _async_adapt_interval(self, *_: Any) -> None:
+        """Set the polling interval from the current activity."""
+        if self._unsub_resume is not None:
+            self._unsub_resume()
+            self._unsub_resume = None
+
+        now = monotonic()
+        freshness = WEBHOOK_FRESHNESS.total_seconds()
+        # A trip without events for a while ended without a tripEnd reaching us
+        for vin, last_event in list(self._trips_active.items()):
+            if now - last_event >= freshness:
+                del self._trips_active[vin]
+        wake_up = [freshness - (now - last) for last in self._trips_active.values()]
+
+        interval: timedelta | None = self._backoff
+        if self._trips_active:
+            interval = self.poll_floor
+        if self._last_webhook is not None:
+            fresh_for = freshness - (now - self._last_webhook)
+            if fresh_for > 0:
+                # Webhooks keep the data current, resume polling once they stop
+                interval = None
+                wake_up.append(fresh_for)
+        if wake_up:
+            self._unsub_resume = async_call_later(
+                self.hass, min(wake_up), self._async_adapt_interval
+            )
+
+        if interval == self.update_interval:
+            return
+        _LOGGER.debug("Polling interval changed to %s", interval)
+        self.update_interval = interval
+        if interval is None:
+            if self._unsub_refresh is not None:
+                self._unsub_refresh()
+                self._unsub_refresh = None
+        else:
+            self._schedule_refresh()
+
+    @callback
+    def async_shutdown_polling(self) -> None:
+        """Stop adapting the polling interval."""
+        self._unsub_stage()
+        self._unsub_scheduler()
+        if self._unsub_resume is not None:
+            self._unsub_resume()
+            self._unsub_resume = None
+
+    async def async_shutdown(self) -> None:
+        """Stop all polling and timers, write a pending snapshot to disk."""
+        self.async_shutdown_polling()
+        self._debounced_refresh.async_cancel()
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+        if self._save_pending:
+            await self._store.async_save(self._data_to_save())
+
+    async def async_load_snapshot(self) -> bool:
+        """Load the vehicles of the last successful update from disk."""
+        if not (vehicles := await self._store.async_load()):
+            return False
+        self.data = _parse_vehicles(vehicles)
+        return True
+
+    @callback
+    def _data_to_save(self) -> list[dict[str, Any]]:
+        """Return the vehicles to store."""
+        self._save_pending = False
+        return [vehicle.as_dict() for vehicle in self.data.values()]
+
+    async def _async_update_data(self) -> dict[str, VehicleState]:
         """Update data via library."""
-        try:
-            data = await self.api.async_get_vehicles()
-            return {vehicle[ATTR_VIN]: vehicle for vehicle in data}
-        except Exception as err:
-            raise UpdateFailed from err
+        if self.data is not None:
+            # The first update is not delayed, it blocks the setup of the entry
+            await self.api.scheduler.async_wait_poll(self._entry_id)
+        self.metrics.increment("polls")
+        with self.metrics.time("poll"):
+            try:
+                data = await self.api.async_get_vehicles()
+            except Exception as err:
+                self.metrics.increment("poll_errors")
+                raise UpdateFailed from err
+            if not self._webhook_since_update and not self._trips_active:
+                self._backoff = min(self._backoff * 2, self.poll_ceiling)
+                self._async_adapt_interval()
+            self._webhook_since_update = False
+            if data is self._response and self.data is not None:
+                # The API returned the same response, nothing to parse or notify
+                self.metrics.increment("polls_unchanged")
+                return self.data
+            self._response = data
+            vehicles = self._parse_changed(data)
+            self._merge_patched(vehicles)
+            if self._changed_vins:
+                self._save_pending = True
+                self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+            return vehicles
+
+    def _parse_changed(self, data: list[dict[str, Any]]) -> dict[str, VehicleState]:
+        """Parse the vehicles whose record changed, keep the others."""
+        previous = self.data or {}
+        vehicles: dict[str, VehicleState] = {}
+        fingerprints: dict[str, str] = {}
+        for record in _valid_vehicles(data):
+            vin = f"{record[ATTR_VIN]}"
+            digest = fingerprint(json.dumps(record, sort_keys=True).encode())
+            fingerprints[vin] = digest
+            if self._fingerprints.get(vin) == digest and vin in previous:
+                vehicles[vin] = previous[vin]
+                continue
+            vehicles[vin] = VehicleState.from_dict(record)
+            self._changed_vins.add(vin)
+        # Removed vehicles are notified to become unavailable
+        self._changed_vins.update(previous.keys() - vehicles.keys())
+        self._fingerprints = fingerprints
+        return vehicles
@@ -3,6 +3,9 @@ import logging
 from typing import Any, Dict, Optional
 
 from homeassistant import config_entries
+from homeassistant.components import webhook
+from homeassistant.core import callback
+from homeassistant.data_entry_flow import FlowResult
 from homeassistant.helpers import config_entry_oauth2_flow
 from homeassistant.util import slugify
 import voluptuous as vol
@@ -10,12 +13,40 @@ import voluptuous as vol
 from .common import BouncieOAuth2Implementation, valid_external_url
 from .const import (
     BOUNCIE_SCHEMA,
+    BUS_EVENTS_FULL,
+    BUS_EVENTS_OFF,
+    BUS_EVENTS_SUMMARY,
     CONF_API_KEY,
+    CONF_BUS_EVENTS,
     CONF_CLIENT_ID,
     CONF_CLIENT_SECRET,
+    CONF_COALESCE_WINDOW,
+    CONF_METRICS,
+    CONF_PATH_MAX_GAP,
+    CONF_PATH_TOLERANCE,
+    CONF_POLL_CEILING,
+    CONF_POLL_FLOOR,
+    CONF_QUEUE_OVERFLOW,
+    CONF_QUEUE_SIZE,
+    CONF_QUEUE_WORKERS,
+    CONF_WEBHOOK_ID,
+    CONF_WEBHOOK_MAX_SIZE,
+    DEFAULT_BUS_EVENTS,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_METRICS,
+    DEFAULT_PATH_MAX_GAP,
+    DEFAULT_PATH_TOLERANCE,
+    DEFAULT_POLL_CEILING,
+    DEFAULT_POLL_FLOOR,
+    DEFAULT_QUEUE_OVERFLOW,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_QUEUE_WORKERS,
+    DEFAULT_WEBHOOK_MAX_SIZE,
     DOMAIN,
     OAUTH2_AUTHORIZE,
     OAUTH2_TOKEN,
+    OVERFLOW_COALESCE,
+    OVERFLOW_DROP_OLDEST,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -35,6 +66,14 @@ class BouncieOAuth2FlowHandler(
         """Return logger."""
         return _LOGGER
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> config_entries.OptionsFlow:
+        """Get the options flow for this handler."""
+        return BouncieOptionsFlowHandler(config_entry)
+
     def __init__(self) -> None:
         """Instantiate config flow."""
         self._stored_data = {}
@@ -101,10 +140,23 @@ class BouncieOAuth2FlowHandler(
             data.update(self._stored_data)
             for entry in self.hass.config_entries.async_entries(DOMAIN):
                 if entry.unique_id == self.unique_id:
-                    self.hass.config_entries.async_update_entry(entry, data=data)
-                    self.hass.async_create_task(
-                        self.hass.config_entries.async_reload(entry.entry_id)
+                    # Keep the webhook URL that is configured at Bouncie
+                    if CONF_WEBHOOK_ID in entry.data:
+                        data[CONF_WEBHOOK_ID] = entry.data[CONF_WEBHOOK_ID]
+                    # A loaded entry reads a new token from its data, new
+                    # credentials need a new implementation and API
+                    credentials_changed = any(
+                        entry.data.get(key) != data[key]
+                        for key in (CONF_CLIENT_SECRET, CONF_API_KEY)
                     )
+                    self.hass.config_entries.async_update_entry(entry, data=data)
+                    if (
+                        credentials_changed
+                        or entry.state is not config_entries.ConfigEntryState.LOADED
+                    ):
+                        self.hass.async_create_task(
+                            self.hass.config_entries.async_reload(entry.entry_id)
+                        )
                     return self.async_abort(reason="reauth_successful")
 
         data.update(
@@ -120,3 +172,87 @@ class BouncieOAuth2FlowHandler(
             )
             self._abort_if_unique_id_configured()
         return self.async_create_entry(title=DOMAIN, data=data)
+
+
+class BouncieOptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle Bouncie options."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(
+        self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        webhook_id = self.config_entry.data.get(CONF_WEBHOOK_ID)
+        return self.async_show_form(
+            step_id="init",
+            description_placeholders={
+                "webhook_url": (
+                    webhook.async_generate_url(self.hass, webhook_id)
+                    if webhook_id is not None
+                    else "-"
+                )
+            },
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_POLL_FLOOR,
+                        default=options.get(CONF_POLL_FLOOR, DEFAULT_POLL_FLOOR),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_POLL_CEILING,
+                        default=options.get(CONF_POLL_CEILING, DEFAULT_POLL_CEILING),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_WEBHOOK_MAX_SIZE,
+                        default=options.get(
+                            CONF_WEBHOOK_MAX_SIZE, DEFAULT_WEBHOOK_MAX_SIZE
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_QUEUE_SIZE,
+                        default=options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_QUEUE_WORKERS,
+                        default=options.get(CONF_QUEUE_WORKERS, DEFAULT_QUEUE_WORKERS),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_QUEUE_OVERFLOW,
+                        default=options.get(
+                            CONF_QUEUE_OVERFLOW, DEFAULT_QUEUE_OVERFLOW
+                        ),
+                    ): vol.In([OVERFLOW_COALESCE, OVERFLOW_DROP_OLDEST]),
+                    vol.Required(
+                        CONF_COALESCE_WINDOW,
+                        default=options.get(
+                            CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=60)),
+                    vol.Required(
+                        CONF_BUS_EVENTS,
+                        default=options.get(CONF_BUS_EVENTS, DEFAULT_BUS_EVENTS),
+                    ): vol.In([BUS_EVENTS_OFF, BUS_EVENTS_SUMMARY, BUS_EVENTS_FULL]),
+                    vol.Required(
+                        CONF_METRICS,
+                        default=options.get(CONF_METRICS, DEFAULT_METRICS),
+                    ): bool,
+                    vol.Required(
+                        CONF_PATH_TOLERANCE,
+                        default=options.get(
+                            CONF_PATH_TOLERANCE, DEFAULT_PATH_TOLERANCE
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                    vol.Required(
+                        CONF_PATH_MAX_GAP,
+                        default=options.get(CONF_PATH_MAX_GAP, DEFAULT_PATH_MAX_GAP),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                }
+            ),
+        )
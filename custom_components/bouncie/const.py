@@ -9,6 +9,7 @@ from homeassistant.const import (  # noqa: F401
     CONF_API_KEY,
     CONF_CLIENT_ID,
     CONF_CLIENT_SECRET,
+    CONF_WEBHOOK_ID,
 )
 import voluptuous as vol
 
@@ -33,6 +34,17 @@ OAUTH2_TOKEN = "https://auth.bouncie.com/oauth/token"
 USER_URL = "https://api.bouncie.dev/v1/user"
 VEHICLES_URL = "https://api.bouncie.dev/v1/vehicles"
 TRIPS_URL = "https://api.bouncie.dev/v1/trips"
+REQUEST_TIMEOUT = 30  # s
+REQUEST_RETRIES = 4
+REQUEST_BACKOFF = 1  # s, doubled for every retry
+REQUEST_BACKOFF_MAX = 60  # s
+REQUEST_CHUNK_SIZE = 16384  # bytes
+REQUEST_MAX_BODY = 10 * 1024 * 1024  # bytes
+RATE_LIMIT_RATE = 2  # requests per second
+RATE_LIMIT_BURST = 10
+TOKEN_REFRESH_MARGIN = 300  # s before expiry the token is refreshed
+REQUEST_CONCURRENCY = 4  # requests in flight across all entries
+POLL_SPACING = 5  # s between the polls of different entries
 BOUNCIE_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_CLIENT_ID): vol.Coerce(str),
@@ -45,13 +57,68 @@ BOUNCIE_SCHEMA = vol.Schema(
 DOMAIN = "bouncie"
 BOUNCIE_EVENT = f"{DOMAIN}_webhook"
 UPDATE_INTERVAL = timedelta(hours=1)
-HA_URL = f"/api/{DOMAIN}"
+WEBHOOK_FRESHNESS = timedelta(minutes=10)
+TRIPS_SYNC_INTERVAL = timedelta(minutes=20)
+TRIPS_MAX_WINDOW = timedelta(days=7)  # Longest range accepted by the trips API
+TRIPS_BACKFILL = timedelta(days=30)
+TRIPS_SYNC_OVERLAP = timedelta(days=1)  # Longest trip, windows overlap by this
+TRIPS_RETENTION = timedelta(days=365)
+STORAGE_VERSION = 1
 API = "api"
 USER_COORDINATOR = "user_coordinator"
 VEHICLES_COORDINATOR = "vehicles_coordinator"
+TRIP_STORE = "trip_store"
+WEBHOOK_QUEUE = "webhook_queue"
+METRICS = "metrics"
+SCHEDULER = "scheduler"
+OPTIONS = "options"
+TASKS = "tasks"
 VERIFICATION_TOKENS = "verification_tokens"
 
+TRIP_BUFFER_SIZE = 1000  # points per vehicle
+TRIP_IDLE_SPEED = 1  # mph, slower counts as idling
+
+# Options
+CONF_POLL_FLOOR = "poll_floor"
+CONF_POLL_CEILING = "poll_ceiling"
+DEFAULT_POLL_FLOOR = 5  # min
+DEFAULT_POLL_CEILING = 240  # min
+CONF_WEBHOOK_MAX_SIZE = "webhook_max_size"
+DEFAULT_WEBHOOK_MAX_SIZE = 512  # kB
+CONF_QUEUE_SIZE = "queue_size"
+CONF_QUEUE_WORKERS = "queue_workers"
+CONF_QUEUE_OVERFLOW = "queue_overflow"
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_QUEUE_WORKERS = 1
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE = "coalesce"
+DEFAULT_QUEUE_OVERFLOW = OVERFLOW_COALESCE
+CONF_COALESCE_WINDOW = "coalesce_window"
+DEFAULT_COALESCE_WINDOW = 2  # s, 0 disables coalescing
+CONF_METRICS = "metrics"
+DEFAULT_METRICS = False
+CONF_BUS_EVENTS = "bus_events"
+BUS_EVENTS_OFF = "off"
+BUS_EVENTS_SUMMARY = "summary"
+BUS_EVENTS_FULL = "full"
+DEFAULT_BUS_EVENTS = BUS_EVENTS_OFF
+CONF_PATH_TOLERANCE = "path_tolerance"
+DEFAULT_PATH_TOLERANCE = 0  # m, 0 disables path simplification
+CONF_PATH_MAX_GAP = "path_max_gap"
+DEFAULT_PATH_MAX_GAP = 120  # s
+
+# Webhook de-duplication
+DEDUP_CACHE_SIZE = 1000  # fingerprints
+DEDUP_TTL = 3600  # s
+
+# State writes are skipped while a value stays within its deadband
+ODOMETER_DEADBAND = 0.01  # mi
+SPEED_DEADBAND = 0.5  # mph
+# Steps of exactly the deadband may come out slightly smaller in floating point
+DEADBAND_EPSILON = 1e-9
+
 # Bouncie Webhooks
+ATTR_ENTRY_ID = "entry_id"
 ATTR_EVENT = "eventType"
 ATTR_IMEI = "imei"
 ATTR_VIN = "vin"
@@ -62,15 +129,13 @@ ATTR_GPS = "gps"
 ATTR_STATS = "stats"
 ATTR_LAT = "lat"
 ATTR_LON = "lon"
+ATTR_TRANSACTION_ID = "transactionId"
+ATTR_START_TIME = "startTime"
+ATTR_END_TIME = "endTime"
 
-WEBHOOK_RESPONSE_SCHEMA = vol.Schema(
-    {
-        vol.Required(ATTR_EVENT): vol.Coerce(str),
-        vol.Required(ATTR_IMEI): vol.Coerce(str),
-        vol.Required(ATTR_VIN): vol.Coerce(str),
-    },
-    extra=vol.ALLOW_EXTRA,
-)
+WEBHOOK_REQUIRED_KEYS = (ATTR_EVENT, ATTR_IMEI, ATTR_VIN)
+WEBHOOK_LOG_BODY = 200  # characters of an invalid body that are logged
+WEBHOOK_LOG_INTERVAL = 60  # s between warnings about invalid webhooks
 EVENT_CONNECT = "connect"
 EVENT_DISCONNECT = "disconnect"
 EVENT_BATTERY = "battery"
@@ -2,29 +2,16 @@
 from __future__ import annotations
 
 import logging
+from typing import Any
 
 from homeassistant.components.device_tracker import SOURCE_TYPE_GPS
 from homeassistant.components.device_tracker.config_entry import TrackerEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .common import BouncieVehiclesDataUpdateCoordinator
-from .const import (
-    ATTR_DATA,
-    ATTR_EVENT,
-    ATTR_GPS,
-    ATTR_LAT,
-    ATTR_LOCATION,
-    ATTR_LON,
-    ATTR_NICKNAME,
-    ATTR_STATS,
-    ATTR_VIN,
-    DOMAIN,
-    EVENT_TRIPDATA,
-    UPDATE_INTERVAL,
-    VEHICLES_COORDINATOR,
-)
+from .const import DOMAIN, UPDATE_INTERVAL, VEHICLES_COORDINATOR
 from .entity import BouncieEntity
 
 _LOGGER = logging.getLogger(__name__)
@@ -42,11 +29,22 @@ async def async_setup_entry(
     coordinator: BouncieVehiclesDataUpdateCoordinator = hass.data[DOMAIN][
         config_entry.entry_id
     ][VEHICLES_COORDINATOR]
-    entities: list[BouncieDeviceTracker] = []
+    known: set[str] = set()
 
-    for vin in coordinator.data:
-        entities.append(BouncieDeviceTracker(coordinator, vin))
-    async_add_entities(entities)
+    @callback
+    def _async_add_vehicles() -> None:
+        """Add trackers for vehicles that were not seen before."""
+        entities: list[BouncieDeviceTracker] = []
+
+        for vin in coordinator.data or {}:
+            if vin not in known:
+                known.add(vin)
+                entities.append(BouncieDeviceTracker(coordinator, vin))
+        if entities:
+            async_add_entities(entities)
+
+    _async_add_vehicles()
+    config_entry.async_on_unload(coordinator.async_add_listener(_async_add_vehicles))
 
 
 class BouncieDeviceTracker(BouncieEntity, TrackerEntity):
@@ -64,10 +62,12 @@ class BouncieDeviceTracker(BouncieEntity, TrackerEntity):
 
         vehicle = coordinator.data[vin]
         self._attr_unique_id = vin
-        self._attr_name = vehicle[ATTR_NICKNAME]
+        self._attr_name = vehicle.nickname
 
-        self._lat: float = vehicle[ATTR_STATS][ATTR_LOCATION][ATTR_LAT]
-        self._lon: float = vehicle[ATTR_STATS][ATTR_LOCATION][ATTR_LON]
+        self._lat: float | None = None
+        self._lon: float | None = None
+        if (location := vehicle.stats.location) is not None:
+            self._lat, self._lon = location.lat, location.lon
 
     @property
     def latitude(self) -> float | None:
@@ -79,23 +79,20 @@ class BouncieDeviceTracker(BouncieEntity, TrackerEntity):
         """Return longitude value of the device."""
         return self._lon
 
+    def _state_snapshot(self) -> tuple[Any, Any]:
+        """Return the location and the remaining state that make up a write."""
+        return (self._lat, self._lon), (self.available, self.extra_state_attributes)
+
     @property
     def source_type(self) -> str:
         """Return the source type, eg gps or router, of the device."""
         return SOURCE_TYPE_GPS
 
-    async def async_event_received(self, event: Event) -> None:
-        """Update status if event received for this entity."""
-        status = event.data
-        if status[ATTR_VIN] == self.vin and status[ATTR_EVENT] == EVENT_TRIPDATA:
-            self._lat = status[ATTR_DATA][-1][ATTR_GPS][ATTR_LAT]
-            self._lon = status[ATTR_DATA][-1][ATTR_GPS][ATTR_LON]
-        self.async_write_ha_state()
-
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        vehicle = self.coordinator.data[self.vin]
-        self._lat = vehicle[ATTR_STATS][ATTR_LOCATION][ATTR_LAT]
-        self._lon = vehicle[ATTR_STATS][ATTR_LOCATION][ATTR_LON]
-        self.async_write_ha_state()
+        if (vehicle := self.vehicle) is not None and (
+            location := vehicle.stats.location
+        ) is not None:
+            self._lat, self._lon = location.lat, location.lon
+        self._async_write_ha_state_if_changed()
@@ -0,0 +1,68 @@
+"""Diagnostics support for Bouncie."""
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .common import BouncieVehiclesDataUpdateCoordinator
+from .const import DOMAIN, TRIP_STORE, VEHICLES_COORDINATOR, WEBHOOK_QUEUE
+from .dispatcher import BouncieWebhookQueue
+from .trips import BouncieTripStore
+
+
+def _seconds(interval: timedelta | None) -> float | None:
+    """Return interval in seconds."""
+    return None if interval is None else interval.total_seconds()
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    coordinator: BouncieVehiclesDataUpdateCoordinator = entry_data[VEHICLES_COORDINATOR]
+    queue: BouncieWebhookQueue = entry_data[WEBHOOK_QUEUE]
+    trip_store: BouncieTripStore = entry_data[TRIP_STORE]
+    return {
+        "polling": {
+            "interval": _seconds(coordinator.effective_interval),
+            "floor": _seconds(coordinator.poll_floor),
+            "ceiling": _seconds(coordinator.poll_ceiling),
+            "last_update_success": coordinator.last_update_success,
+            "active_trips": coordinator.has_active_trips(),
+        },
+        "scheduler": {
+            "entries": coordinator.api.scheduler.entries,
+            "running": coordinator.api.scheduler.running,
+            "waiting": coordinator.api.scheduler.waiting,
+        },
+        "webhooks": {
+            "dispatched": coordinator.dispatcher.dispatched,
+            "skipped": coordinator.dispatcher.skipped,
+            "coalesced": coordinator.dispatcher.coalesced,
+            "duplicates": coordinator.dispatcher.filter.duplicates,
+            "stale": coordinator.dispatcher.filter.stale,
+        },
+        "queue": {
+            "depth": queue.depth,
+            "max_depth": queue.max_depth,
+            "enqueued": queue.enqueued,
+            "processed": queue.processed,
+            "dropped": queue.dropped,
+            "coalesced": queue.coalesced,
+            "average_latency": queue.average_latency,
+            "max_latency": queue.max_latency,
+        },
+        "metrics": coordinator.metrics.as_dict(),
+        "trips": {
+            vin: {
+                "synced": trip_store.synced(vehicle.imei),
+                "history": trip_store.trips(vehicle.imei),
+            }
+            for vin, vehicle in (coordinator.data or {}).items()
+            if vehicle.imei is not None
+        },
+    }
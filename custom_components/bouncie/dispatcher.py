@@ -0,0 +1,429 @@
+"""Webhook event dispatching for Bouncie."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime
+from logging import getLogger
+from time import monotonic
+from typing import Any, Callable, Iterable
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt
+
+from .const import (
+    ATTR_DATA,
+    ATTR_ENTRY_ID,
+    ATTR_EVENT,
+    ATTR_GPS,
+    ATTR_LAT,
+    ATTR_LON,
+    ATTR_TRANSACTION_ID,
+    ATTR_VIN,
+    BOUNCIE_EVENT,
+    BUS_EVENTS_FULL,
+    BUS_EVENTS_OFF,
+    BUS_EVENTS_SUMMARY,
+    DEDUP_CACHE_SIZE,
+    DEDUP_TTL,
+    EVENT_BATTERY,
+    EVENT_CONNECT,
+    EVENT_DISCONNECT,
+    EVENT_MIL,
+    EVENT_TRIPDATA,
+    EVENT_TRIPEND,
+    EVENT_TRIPMETRICS,
+    EVENT_TRIPSTART,
+    OVERFLOW_COALESCE,
+)
+from .metrics import NO_METRICS, BouncieMetrics
+from .trips import BouncieTripBuffer
+
+_LOGGER = getLogger(__name__)
+
+EventCallback = Callable[[dict[str, Any]], None]
+
+# Event types whose consecutive events of a vehicle can be merged into one
+COALESCABLE_EVENTS = (EVENT_TRIPDATA, EVENT_TRIPMETRICS)
+
+# Section of the payload that holds the time an event happened
+EVENT_TIME_KEYS = {
+    EVENT_TRIPSTART: "start",
+    EVENT_TRIPEND: "end",
+    EVENT_TRIPMETRICS: "metrics",
+    EVENT_MIL: "mil",
+    EVENT_BATTERY: "battery",
+    EVENT_CONNECT: "connect",
+    EVENT_DISCONNECT: "disconnect",
+}
+
+
+def parse_timestamp(value: Any) -> float:
+    """Return an ISO 8601 timestamp as seconds since the epoch, 0 if invalid."""
+    if (parsed := dt.parse_datetime(f"{value}")) is None:
+        return 0.0
+    return parsed.timestamp()
+
+
+def event_timestamp(status: dict[str, Any]) -> float:
+    """Return the time an event happened, 0 if unknown."""
+    if status[ATTR_EVENT] == EVENT_TRIPDATA:
+        points = status.get(ATTR_DATA) or ()
+        values = [point.get("timestamp") for point in points if isinstance(point, dict)]
+    else:
+        section = status.get(EVENT_TIME_KEYS.get(status[ATTR_EVENT], ""))
+        values = [section.get("timestamp")] if isinstance(section, dict) else []
+    return max((parse_timestamp(value) for value in values), default=0.0)
+
+
+def summarize_event(status: dict[str, Any]) -> dict[str, Any]:
+    """Return the public summary of an event, without the trip data points."""
+    timestamp = event_timestamp(status)
+    summary = {
+        ATTR_ENTRY_ID: status.get(ATTR_ENTRY_ID),
+        ATTR_VIN: status[ATTR_VIN],
+        ATTR_EVENT: status[ATTR_EVENT],
+        "timestamp": (
+            dt.utc_from_timestamp(timestamp).isoformat() if timestamp else None
+        ),
+    }
+    for point in reversed(status.get(ATTR_DATA) or ()):
+        gps = point.get(ATTR_GPS) if isinstance(point, dict) else None
+        if isinstance(gps, dict) and None not in (gps.get(ATTR_LAT), gps.get(ATTR_LON)):
+            summary[ATTR_LAT] = gps[ATTR_LAT]
+            summary[ATTR_LON] = gps[ATTR_LON]
+            break
+    return summary
+
+
+def merge_events(older: dict[str, Any], newer: dict[str, Any]) -> None:
+    """Merge a newer event into an older event of the same vehicle and type."""
+    data = older.get(ATTR_DATA)
+    older.update(newer)
+    if newer[ATTR_EVENT] == EVENT_TRIPDATA:
+        older[ATTR_DATA] = [*(data or ()), *(newer.get(ATTR_DATA) or ())]
+
+
+def unseen_points(older: dict[str, Any], newer: dict[str, Any]) -> list[Any]:
+    """Return the trip data points of newer whose time older does not have."""
+    seen = {
+        point.get("timestamp")
+        for point in older.get(ATTR_DATA) or ()
+        if isinstance(point, dict)
+    }
+    seen.discard(None)
+    return [
+        point
+        for point in newer.get(ATTR_DATA) or ()
+        if not isinstance(point, dict) or point.get("timestamp") not in seen
+    ]
+
+
+class BouncieEventFilter:
+    """Reject retried and out of order webhook events."""
+
+    def __init__(self, maxsize: int = DEDUP_CACHE_SIZE, ttl: float = DEDUP_TTL) -> None:
+        """Initialize."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.duplicates: int = 0
+        self.stale: int = 0
+        # Fingerprints of recent events in order of expiry
+        self._seen: OrderedDict[tuple[str, str, Any, float], float] = OrderedDict()
+        # Time of the newest accepted event per VIN and event type
+        self._high_water: dict[tuple[str, str], float] = {}
+
+    @callback
+    def async_accept(self, status: dict[str, Any]) -> bool:
+        """Return if an event is neither a duplicate nor older than the state."""
+        vin = status[ATTR_VIN]
+        event_type = status[ATTR_EVENT]
+        if not (timestamp := event_timestamp(status)):
+            return True
+
+        now = monotonic()
+        while self._seen and next(iter(self._seen.values())) < now:
+            self._seen.popitem(last=False)
+        fingerprint = (vin, event_type, status.get(ATTR_TRANSACTION_ID), timestamp)
+        duplicate = fingerprint in self._seen
+        self._seen[fingerprint] = now + self.ttl
+        self._seen.move_to_end(fingerprint)
+        if len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+        if duplicate:
+            self.duplicates += 1
+            return False
+
+        # Late trip data is merged in time order, unless it is from an older trip
+        key = (vin, EVENT_TRIPSTART if event_type in COALESCABLE_EVENTS else event_type)
+        if timestamp < self._high_water.get(key, 0.0):
+            self.stale += 1
+            return False
+        if event_type not in COALESCABLE_EVENTS:
+            self._high_water[key] = timestamp
+        return True
+
+
+class BouncieWebhookDispatcher:
+    """Route webhook events of one config entry to the subscribed entities."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry_id: str,
+        coalesce_window: float = 0,
+        metrics: BouncieMetrics = NO_METRICS,
+        bus_events: str = BUS_EVENTS_OFF,
+    ) -> None:
+        """Initialize."""
+        self.hass = hass
+        self.entry_id = entry_id
+        self.coalesce_window = coalesce_window
+        self.metrics = metrics
+        self.bus_events = bus_events
+        self.dispatched: int = 0
+        self.skipped: int = 0
+        self.coalesced: int = 0
+        self.filter = BouncieEventFilter()
+        # Trip events of a vehicle held back until the coalescing window ends
+        self._pending: dict[tuple[str, str], dict[str, Any]] = {}
+        self._unsub_flush: dict[tuple[str, str], CALLBACK_TYPE] = {}
+        self._subscribers: dict[tuple[str, str], list[EventCallback]] = {}
+        # Number of subscriptions, an entity subscribes once to all its types
+        self._subscriber_count: int = 0
+        # Stages see every event once, before it is delivered to subscribers
+        self.trip_buffer = BouncieTripBuffer()
+        self._stages: list[EventCallback] = [self.trip_buffer.async_ingest]
+
+    @callback
+    def async_stop(self) -> None:
+        """Deliver held back events."""
+        for key in list(self._pending):
+            self._async_flush(key)
+
+    @callback
+    def async_add_stage(self, stage: EventCallback) -> CALLBACK_TYPE:
+        """Add a stage that processes every event before it is delivered."""
+        self._stages.append(stage)
+
+        @callback
+        def _async_remove_stage() -> None:
+            self._stages.remove(stage)
+
+        return _async_remove_stage
+
+    @callback
+    def async_subscribe(
+        self, vin: str, event_types: Iterable[str], action: EventCallback
+    ) -> CALLBACK_TYPE:
+        """Subscribe to events of the given types for a vehicle."""
+        keys = [(vin, event_type) for event_type in event_types]
+        for key in keys:
+            self._subscribers.setdefault(key, []).append(action)
+        self._subscriber_count += 1
+
+        @callback
+        def _async_unsubscribe() -> None:
+            for key in keys:
+                subscribers = self._subscribers[key]
+                subscribers.remove(action)
+                if not subscribers:
+                    del self._subscribers[key]
+            self._subscriber_count -= 1
+
+        return _async_unsubscribe
+
+    @callback
+    def async_handle_webhook(self, status: dict[str, Any]) -> None:
+        """Dispatch a received webhook and fire the public event if enabled."""
+        self.async_dispatch(status)
+        # The recorder stores bus events, trip data only goes out when asked for
+        if self.bus_events == BUS_EVENTS_SUMMARY:
+            self.hass.bus.async_fire(BOUNCIE_EVENT, summarize_event(status))
+        elif self.bus_events == BUS_EVENTS_FULL:
+            self.hass.bus.async_fire(BOUNCIE_EVENT, status)
+
+    @callback
+    def async_dispatch(self, status: dict[str, Any]) -> None:
+        """Deliver a webhook event, merging trip events within the window."""
+        self.metrics.increment(f"events.{status[ATTR_EVENT]}")
+        if not self.filter.async_accept(status):
+            self.metrics.increment("events_rejected")
+            _LOGGER.debug(
+                "Ignoring repeated or outdated %s event for %s",
+                status[ATTR_EVENT],
+                status[ATTR_VIN],
+            )
+            return
+
+        vin = status[ATTR_VIN]
+        if not self.coalesce_window:
+            self._async_deliver(status)
+            return
+
+        if status[ATTR_EVENT] not in COALESCABLE_EVENTS:
+            # Held back trip events happened before this one
+            for event_type in COALESCABLE_EVENTS:
+                self._async_flush((vin, event_type))
+            self._async_deliver(status)
+            return
+
+        key = (vin, status[ATTR_EVENT])
+        if (pending := self._pending.get(key)) is not None:
+            merge_events(pending, status)
+            self.coalesced += 1
+            return
+
+        self._pending[key] = dict(status)
+
+        @callback
+        def _async_flush_later(_: datetime) -> None:
+            self._unsub_flush.pop(key, None)
+            self._async_flush(key)
+
+        self._unsub_flush[key] = async_call_later(
+            self.hass, self.coalesce_window, _async_flush_later
+        )
+
+    @callback
+    def _async_flush(self, key: tuple[str, str]) -> None:
+        """Deliver the held back event of a vehicle and type."""
+        if (unsub := self._unsub_flush.pop(key, None)) is not None:
+            unsub()
+        if (pending := self._pending.pop(key, None)) is not None:
+            self._async_deliver(pending)
+
+    @callback
+    def _async_deliver(self, status: dict[str, Any]) -> None:
+        """Deliver a webhook event to the subscribers of its VIN and type."""
+        with self.metrics.time("dispatch"):
+            for stage in self._stages:
+                stage(status)
+            subscribers = tuple(
+                self._subscribers.get((status[ATTR_VIN], status[ATTR_EVENT]), ())
+            )
+            for action in subscribers:
+                action(status)
+        self.dispatched += len(subscribers)
+        self.skipped += self._subscriber_count - len(subscribers)
+        _LOGGER.debug(
+            "Dispatched %s event for %s to %s subscriber(s)",
+            status[ATTR_EVENT],
+            status[ATTR_VIN],
+            len(subscribers),
+        )
+
+
+class BouncieWebhookQueue:
+    """Bounded queue of received webhooks, drained by background workers."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        handler: EventCallback,
+        maxsize: int,
+        workers: int,
+        overflow: str,
+    ) -> None:
+        """Initialize."""
+        self.hass = hass
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.enqueued: int = 0
+        self.processed: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+        self.max_depth: int = 0
+        self.max_latency: float = 0.0
+        self._total_latency: float = 0.0
+        self._handler = handler
+        self._workers = workers
+        self._queue: deque[tuple[float, dict[str, Any]]] = deque()
+        self._not_empty = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        """Return the number of queued webhooks."""
+        return len(self._queue)
+
+    @property
+    def average_latency(self) -> float | None:
+        """Return the average time between receiving and handling a webhook."""
+        if not self.processed:
+            return None
+        return self._total_latency / self.processed
+
+    @callback
+    def async_start(self) -> None:
+        """Start the workers."""
+        # Workers run for the lifetime of the entry and are not tracked by hass
+        self._tasks = [
+            self.hass.loop.create_task(self._async_worker())
+            for _ in range(self._workers)
+        ]
+
+    async def async_stop(self) -> None:
+        """Stop the workers and handle the webhooks still queued."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # The webhooks were acknowledged already, they must not get lost
+        while self._queue:
+            self._async_handle(*self._queue.popleft())
+
+    @callback
+    def async_put(self, status: dict[str, Any]) -> None:
+        """Queue a webhook event."""
+        self.enqueued += 1
+        if len(self._queue) >= self.maxsize:
+            if self.overflow == OVERFLOW_COALESCE and self._async_coalesce(status):
+                self.coalesced += 1
+                return
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((monotonic(), status))
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._not_empty.set()
+
+    @callback
+    def _async_coalesce(self, status: dict[str, Any]) -> bool:
+        """Merge status into the newest queued event of its vehicle and type."""
+        if status[ATTR_EVENT] not in COALESCABLE_EVENTS:
+            return False
+        for _, queued in reversed(self._queue):
+            if queued[ATTR_VIN] != status[ATTR_VIN]:
+                continue
+            if queued[ATTR_EVENT] != status[ATTR_EVENT]:
+                # Never merge across another event of the same vehicle
+                return False
+            if status[ATTR_EVENT] == EVENT_TRIPDATA:
+                # The filter only sees the merged event, a retry must not add points
+                status = {**status, ATTR_DATA: unseen_points(queued, status)}
+            merge_events(queued, status)
+            return True
+        return False
+
+    async def _async_worker(self) -> None:
+        """Handle queued webhooks."""
+        while True:
+            while not self._queue:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            self._async_handle(*self._queue.popleft())
+            # Let the webhook handler and other tasks run between events
+            await asyncio.sleep(0)
+
+    @callback
+    def _async_handle(self, received: float, status: dict[str, Any]) -> None:
+        """Handle a queued webhook."""
+        try:
+            self._handler(status)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Unable to handle %s event", status[ATTR_EVENT])
+        latency = monotonic() - received
+        self.processed += 1
+        self._total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
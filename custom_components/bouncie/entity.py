@@ -1,57 +1,131 @@
 """BlueprintEntity class"""
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from logging import getLogger
+from numbers import Number
+from typing import Any
 
-from homeassistant.core import Event, callback
+from homeassistant.core import callback
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .common import BouncieVehiclesDataUpdateCoordinator
-from .const import (
-    ATTR_MAKE,
-    ATTR_MODEL,
-    ATTR_NAME,
-    ATTR_NICKNAME,
-    BOUNCIE_EVENT,
-    BOUNCIE_PORTAL,
-    DOMAIN,
-)
+from .const import DEADBAND_EPSILON
+from .models import VehicleState
+from .trips import TripColumns
+
+_LOGGER = getLogger(__name__)
 
 
 class BouncieEntity(CoordinatorEntity, ABC):
     """Bouncie Entity Base."""
 
+    coordinator: BouncieVehiclesDataUpdateCoordinator
+    _event_types: tuple[str, ...] = ()
+    _deadband: float | None = None
+
     def __init__(self, coordinator: BouncieVehiclesDataUpdateCoordinator, vin: str):
         super().__init__(coordinator)
         self.vin: str = vin
+        self.suppressed_writes: int = 0
+        self._last_snapshot: tuple[Any, Any] | None = None
+
+    @property
+    def vehicle(self) -> VehicleState | None:
+        """Return the vehicle, None if it is no longer in the account."""
+        return (self.coordinator.data or {}).get(self.vin)
 
     @property
-    def device_info(self) -> DeviceInfo:
+    def device_info(self) -> DeviceInfo | None:
         """Return device information about this entity."""
-        vehicle = self.coordinator.data[self.vin]
-        return DeviceInfo(
-            name=vehicle[ATTR_NICKNAME],
-            manufacturer=vehicle[ATTR_MODEL][ATTR_MAKE],
-            model=vehicle[ATTR_MODEL][ATTR_NAME],
-            identifiers={(DOMAIN, self.vin)},
-            configuration_url=BOUNCIE_PORTAL,
-        )
+        if (vehicle := self.vehicle) is None:
+            return None
+        return vehicle.device_info
+
+    @property
+    def trip(self) -> TripColumns:
+        """Return the buffered trip data of this vehicle."""
+        return self.coordinator.dispatcher.trip_buffer[self.vin]
 
     @property
     def available(self) -> bool:
         """Return if entity is available."""
-        return self.vin in self.coordinator.data
+        return self.vehicle is not None
 
     async def async_added_to_hass(self) -> None:
         """Register callbacks when entity is added."""
-        await super().async_added_to_hass()
-        # Register callback for webhook event
+        # Skip the listener of CoordinatorEntity, it runs for every poll while
+        # the coordinator only notifies the vehicles that changed
+        await super(CoordinatorEntity, self).async_added_to_hass()
+        # Register callback for webhook updates of this vehicle
         self.async_on_remove(
-            self.hass.bus.async_listen(BOUNCIE_EVENT, self.async_event_received)
+            self.coordinator.async_add_vin_listener(
+                self.vin, self._async_handle_vehicle_update
+            )
         )
+        if self._event_types:
+            self.async_on_remove(
+                self.coordinator.dispatcher.async_subscribe(
+                    self.vin, self._event_types, self.async_event_received
+                )
+            )
 
-    @abstractmethod
-    async def async_event_received(self, event: Event) -> None:
-        """Handle updates from webhooks."""
+    @callback
+    def _async_handle_vehicle_update(self) -> None:
+        """Handle an update of this vehicle."""
+        with self.coordinator.metrics.time("entity_update"):
+            self._handle_coordinator_update()
+
+    def _state_snapshot(self) -> tuple[Any, Any]:
+        """Return the value and the remaining state that make up a write."""
+        return self.native_value, (self.available, self.extra_state_attributes)
+
+    def _is_unchanged(self, snapshot: tuple[Any, Any]) -> bool:
+        """Return if snapshot does not differ from the last written state."""
+        if self._last_snapshot is None:
+            return False
+        last_value, last_rest = self._last_snapshot
+        value, rest = snapshot
+        if rest != last_rest:
+            return False
+        if value == last_value:
+            return True
+        # Coming to a stop is always written, however small the step
+        return (
+            self._deadband is not None
+            and isinstance(value, Number)
+            and isinstance(last_value, Number)
+            and value != 0
+            and abs(value - last_value) < self._deadband - DEADBAND_EPSILON
+        )
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        """Write the state to the state machine and remember what was written."""
+        self._last_snapshot = self._state_snapshot()
+        super().async_write_ha_state()
+
+    @callback
+    def _async_write_ha_state_if_changed(self) -> None:
+        """Write the state only if it differs from the last written state."""
+        snapshot = self._state_snapshot()
+        if self._is_unchanged(snapshot):
+            self.suppressed_writes += 1
+            self.coordinator.metrics.increment("state_writes_suppressed")
+            _LOGGER.debug(
+                "Suppressed unchanged state write for %s (%s total)",
+                self.entity_id,
+                self.suppressed_writes,
+            )
+            return
+        self._last_snapshot = snapshot
+        self.coordinator.metrics.increment("state_writes")
+        super().async_write_ha_state()
+
+    @callback
+    def async_event_received(self, status: dict[str, Any]) -> None:
+        """Handle webhook events of the subscribed event types."""
 
     @callback
     @abstractmethod
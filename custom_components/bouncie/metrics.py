@@ -0,0 +1,141 @@
+"""Instrumentation of the Bouncie hot paths."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+from time import perf_counter
+from typing import Any
+
+# Upper bounds of the timing histogram buckets in seconds
+HISTOGRAM_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """Count observed durations per bucket."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add an observed duration."""
+        self.counts[bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def average(self) -> float | None:
+        """Return the average duration."""
+        return self.total / self.count if self.count else None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the histogram for diagnostics."""
+        labels = [f"<={bound}" for bound in HISTOGRAM_BUCKETS] + ["+inf"]
+        return {
+            "count": self.count,
+            "average": self.average,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _Timer:
+    """Observe the duration of a with block."""
+
+    __slots__ = ("_metrics", "_name", "_started")
+
+    def __init__(self, metrics: BouncieMetrics, name: str) -> None:
+        """Initialize."""
+        self._metrics = metrics
+        self._name = name
+        self._started = 0.0
+
+    def __enter__(self) -> None:
+        """Start timing."""
+        self._started = perf_counter()
+
+    def __exit__(self, *_: Any) -> None:
+        """Observe the elapsed time."""
+        self._metrics.observe(self._name, perf_counter() - self._started)
+
+
+class _NoOpTimer:
+    """Timer that observes nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        """Do nothing."""
+
+    def __exit__(self, *_: Any) -> None:
+        """Do nothing."""
+
+
+_NO_OP_TIMER = _NoOpTimer()
+
+
+class BouncieMetrics:
+    """Counters and timing histograms of one config entry."""
+
+    enabled = True
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.counters: Counter[str] = Counter()
+        self.histograms: dict[str, Histogram] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Increment a counter."""
+        self.counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Add a duration to a histogram."""
+        if (histogram := self.histograms.get(name)) is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def time(self, name: str) -> _Timer | _NoOpTimer:
+        """Return a context manager that times its block."""
+        return _Timer(self, name)
+
+    def total(self, prefix: str) -> int:
+        """Return the sum of the counters that start with prefix."""
+        return sum(
+            value for name, value in self.counters.items() if name.startswith(prefix)
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return all metrics for diagnostics."""
+        return {
+            "enabled": self.enabled,
+            "counters": dict(sorted(self.counters.items())),
+            "timings": {
+                name: histogram.as_dict()
+                for name, histogram in sorted(self.histograms.items())
+            },
+        }
+
+
+class NoOpMetrics(BouncieMetrics):
+    """Metrics that record nothing, used while instrumentation is turned off."""
+
+    enabled = False
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Do nothing."""
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Do nothing."""
+
+    def time(self, name: str) -> _Timer | _NoOpTimer:
+        """Return a context manager that does nothing."""
+        return _NO_OP_TIMER
+
+
+NO_METRICS = NoOpMetrics()
@@ -0,0 +1,193 @@
+"""Vehicle state models for Bouncie."""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.util import dt
+
+from .const import (
+    ATTR_IMEI,
+    ATTR_LAT,
+    ATTR_LOCATION,
+    ATTR_LON,
+    ATTR_MAKE,
+    ATTR_MODEL,
+    ATTR_NAME,
+    ATTR_NICKNAME,
+    ATTR_STATS,
+    ATTR_VIN,
+    BOUNCIE_PORTAL,
+    DOMAIN,
+)
+
+
+def _float(value: Any) -> float | None:
+    """Return value as float, None if it is missing or invalid."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class VehicleLocation:
+    """Last known position of a vehicle."""
+
+    __slots__ = ("lat", "lon")
+
+    def __init__(self, lat: float, lon: float) -> None:
+        """Initialize."""
+        self.lat = lat
+        self.lon = lon
+
+    def __eq__(self, other: object) -> bool:
+        """Return if both locations are the same position."""
+        if not isinstance(other, VehicleLocation):
+            return NotImplemented
+        return self.lat == other.lat and self.lon == other.lon
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        """Return the position."""
+        return f"VehicleLocation({self.lat}, {self.lon})"
+
+    @classmethod
+    def from_dict(cls, data: Any) -> VehicleLocation | None:
+        """Parse a location, None if it has no position."""
+        if not isinstance(data, dict):
+            return None
+        lat, lon = _float(data.get(ATTR_LAT)), _float(data.get(ATTR_LON))
+        if lat is None or lon is None:
+            return None
+        return cls(lat, lon)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the location in the format of the API."""
+        return {ATTR_LAT: self.lat, ATTR_LON: self.lon}
+
+
+class VehicleStats:
+    """Last known stats of a vehicle."""
+
+    __slots__ = (
+        "local_time_zone",
+        "last_updated",
+        "odometer",
+        "location",
+        "fuel_level",
+        "speed",
+    )
+
+    def __init__(
+        self,
+        local_time_zone: str | None = None,
+        last_updated: datetime | None = None,
+        odometer: float | None = None,
+        location: VehicleLocation | None = None,
+        fuel_level: float | None = None,
+        speed: float | None = None,
+    ) -> None:
+        """Initialize."""
+        self.local_time_zone = local_time_zone
+        self.last_updated = last_updated
+        self.odometer = odometer
+        self.location = location
+        self.fuel_level = fuel_level
+        self.speed = speed
+
+    @property
+    def updated_at(self) -> float:
+        """Return when the stats were updated in seconds since the epoch."""
+        return 0.0 if self.last_updated is None else self.last_updated.timestamp()
+
+    @classmethod
+    def from_dict(cls, data: Any) -> VehicleStats:
+        """Parse the stats of a vehicle."""
+        if not isinstance(data, dict):
+            return cls()
+        return cls(
+            data.get("localTimeZone"),
+            dt.parse_datetime(f"{data.get('lastUpdated')}"),
+            _float(data.get("odometer")),
+            VehicleLocation.from_dict(data.get(ATTR_LOCATION)),
+            _float(data.get("fuelLevel")),
+            _float(data.get("speed")),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the stats in the format of the API."""
+        data = {
+            "localTimeZone": self.local_time_zone,
+            "lastUpdated": (
+                None if self.last_updated is None else self.last_updated.isoformat()
+            ),
+            "odometer": self.odometer,
+            ATTR_LOCATION: None if self.location is None else self.location.as_dict(),
+            "fuelLevel": self.fuel_level,
+            "speed": self.speed,
+        }
+        return {key: value for key, value in data.items() if value is not None}
+
+
+class VehicleState:
+    """A vehicle and its last known stats."""
+
+    __slots__ = ("vin", "imei", "nickname", "make", "model", "stats", "_device_info")
+
+    def __init__(
+        self,
+        vin: str,
+        imei: str | None,
+        nickname: str,
+        make: str | None,
+        model: str | None,
+        stats: VehicleStats,
+    ) -> None:
+        """Initialize."""
+        self.vin = vin
+        self.imei = imei
+        self.nickname = nickname
+        self.make = make
+        self.model = model
+        self.stats = stats
+        self._device_info: DeviceInfo | None = None
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return the device of the vehicle."""
+        if self._device_info is None:
+            self._device_info = DeviceInfo(
+                name=self.nickname,
+                manufacturer=self.make,
+                model=self.model,
+                identifiers={(DOMAIN, self.vin)},
+                configuration_url=BOUNCIE_PORTAL,
+            )
+        return self._device_info
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> VehicleState:
+        """Parse a vehicle of the API."""
+        model = data.get(ATTR_MODEL) or {}
+        vin = f"{data[ATTR_VIN]}"
+        imei = data.get(ATTR_IMEI)
+        return cls(
+            vin,
+            f"{imei}" if imei is not None else None,
+            data.get(ATTR_NICKNAME) or vin,
+            model.get(ATTR_MAKE),
+            model.get(ATTR_NAME),
+            VehicleStats.from_dict(data.get(ATTR_STATS)),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the vehicle in the format of the API."""
+        return {
+            ATTR_MODEL: {ATTR_MAKE: self.make, ATTR_NAME: self.model},
+            ATTR_NICKNAME: self.nickname,
+            ATTR_VIN: self.vin,
+            ATTR_IMEI: self.imei,
+            ATTR_STATS: self.stats.as_dict(),
+        }
@@ -0,0 +1,158 @@
+"""Scheduling of the Bouncie API requests of all config entries."""
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+import heapq
+from itertools import count
+from time import monotonic
+from typing import AsyncIterator, Callable
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .const import (
+    DOMAIN,
+    POLL_SPACING,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_RATE,
+    REQUEST_CONCURRENCY,
+    SCHEDULER,
+)
+
+PRIORITY_ACTIVE = 0
+PRIORITY_IDLE = 1
+
+
+class TokenBucket:
+    """Rate limiter that allows bursts up to capacity at a steady rate."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """Initialize."""
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens: float = capacity
+        self._updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    async def async_acquire(self) -> None:
+        """Wait until a request may be made."""
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BouncieScheduler:
+    """Stagger the polls and share the request pipeline of all config entries."""
+
+    def __init__(
+        self,
+        concurrency: int = REQUEST_CONCURRENCY,
+        poll_spacing: float = POLL_SPACING,
+    ) -> None:
+        """Initialize."""
+        self.concurrency = concurrency
+        self.poll_spacing = poll_spacing
+        self.running: int = 0
+        self._limiters: dict[str, TokenBucket] = {}
+        self._active_fns: dict[str, Callable[[], bool]] = {}
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._sequence = count()
+        self._next_poll: float = 0.0
+
+    @property
+    def entries(self) -> int:
+        """Return the number of registered config entries."""
+        return len(self._active_fns)
+
+    @property
+    def waiting(self) -> int:
+        """Return the number of requests waiting for a slot."""
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    @callback
+    def async_register(
+        self, entry_id: str, is_active: Callable[[], bool]
+    ) -> CALLBACK_TYPE:
+        """Register a config entry, is_active tells if it has trips in progress."""
+        self._active_fns[entry_id] = is_active
+
+        @callback
+        def _async_unregister() -> None:
+            self._active_fns.pop(entry_id, None)
+
+        return _async_unregister
+
+    def priority(self, entry_id: str) -> int:
+        """Return the priority of the requests of a config entry."""
+        is_active = self._active_fns.get(entry_id)
+        if is_active is not None and is_active():
+            return PRIORITY_ACTIVE
+        return PRIORITY_IDLE
+
+    def rate_limiter(self, api_key: str) -> TokenBucket:
+        """Return the rate limiter shared by all entries using an API key."""
+        if (limiter := self._limiters.get(api_key)) is None:
+            limiter = self._limiters[api_key] = TokenBucket(
+                RATE_LIMIT_RATE, RATE_LIMIT_BURST
+            )
+        return limiter
+
+    async def async_wait_poll(self, entry_id: str) -> None:
+        """Wait for the turn of an entry to poll, active entries do not wait."""
+        if self.priority(entry_id) == PRIORITY_ACTIVE:
+            return
+        now = monotonic()
+        start = max(now, self._next_poll)
+        self._next_poll = start + self.poll_spacing
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    @asynccontextmanager
+    async def async_request_slot(self, entry_id: str) -> AsyncIterator[None]:
+        """Hold one of the shared request slots, active entries are served first."""
+        await self._async_acquire(self.priority(entry_id))
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _async_acquire(self, priority: int) -> None:
+        """Wait for a free request slot."""
+        if self.running < self.concurrency and not self.waiting:
+            self.running += 1
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over right before the cancellation
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        """Hand the slot to the next waiter, free it if there is none."""
+        while self._waiters:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+
+@callback
+def async_get_scheduler(hass: HomeAssistant) -> BouncieScheduler:
+    """Return the scheduler shared by all config entries."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if (scheduler := domain_data.get(SCHEDULER)) is None:
+        scheduler = domain_data[SCHEDULER] = BouncieScheduler()
+    return scheduler
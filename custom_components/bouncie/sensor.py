@@ -2,31 +2,46 @@
 from __future__ import annotations
 
 import logging
+from typing import Any, Callable
 
 from homeassistant.components.sensor import (
     STATE_CLASS_MEASUREMENT,
     STATE_CLASS_TOTAL,
+    STATE_CLASS_TOTAL_INCREASING,
     SensorEntity,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import LENGTH_MILES, PERCENTAGE, SPEED_MILES_PER_HOUR
-from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.const import (
+    LENGTH_MILES,
+    PERCENTAGE,
+    SPEED_MILES_PER_HOUR,
+    TIME_MILLISECONDS,
+    TIME_MINUTES,
+)
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import StateType
 from homeassistant.util import dt
 
 from .common import BouncieVehiclesDataUpdateCoordinator
 from .const import (
-    ATTR_DATA,
-    ATTR_EVENT,
-    ATTR_NICKNAME,
-    ATTR_STATS,
-    ATTR_VIN,
+    CONF_CLIENT_ID,
     DOMAIN,
     EVENT_TRIPDATA,
     EVENT_TRIPEND,
+    EVENT_TRIPMETRICS,
+    EVENT_TRIPSTART,
+    METRICS,
+    NAME,
+    ODOMETER_DEADBAND,
+    SPEED_DEADBAND,
     VEHICLES_COORDINATOR,
 )
 from .entity import BouncieEntity
+from .metrics import BouncieMetrics
+from .trips import TripAggregate
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -41,49 +56,209 @@ async def async_setup_entry(
         config_entry.entry_id
     ][VEHICLES_COORDINATOR]
 
-    entities: list[SensorEntity] = []
+    known: set[str] = set()
+
+    @callback
+    def _async_add_vehicles() -> None:
+        """Add sensors for vehicles that were not seen before."""
+        vehicles = {
+            vin: vehicle
+            for vin, vehicle in (coordinator.data or {}).items()
+            if vin not in known
+        }
+        known.update(vehicles)
+
+        entities: list[SensorEntity] = []
+
+        # Odometer
+        entities.extend(
+            BouncieOdometer(coordinator, vin)
+            for vin, vehicle in vehicles.items()
+            if vehicle.stats.odometer is not None
+        )
+
+        # Fuellevel
+        entities.extend(
+            BouncieFuelLevelSensor(coordinator, vin)
+            for vin, vehicle in vehicles.items()
+            if vehicle.stats.fuel_level is not None
+        )
+
+        # Speed
+        entities.extend(
+            BouncieSpeedSensor(coordinator, vin)
+            for vin, vehicle in vehicles.items()
+            if vehicle.stats.speed is not None
+        )
+
+        # Trip totals
+        entities.extend(
+            BouncieTripSensor(coordinator, vin, *sensor)
+            for vin in vehicles
+            for sensor in TRIP_SENSORS
+        )
 
-    # Odometer
-    entities.extend(
-        BouncieOdometer(coordinator, vin)
-        for vin, vehicle in coordinator.data.items()
-        if vehicle[ATTR_STATS].get("odometer") is not None
-    )
+        if entities:
+            async_add_entities(entities)
 
-    # Fuellevel
-    entities.extend(
-        BouncieFuelLevelSensor(coordinator, vin)
-        for vin, vehicle in coordinator.data.items()
-        if vehicle[ATTR_STATS].get("fuelLevel") is not None
-    )
+    _async_add_vehicles()
+    config_entry.async_on_unload(coordinator.async_add_listener(_async_add_vehicles))
 
-    # Speed
-    entities.extend(
-        BouncieSpeedSensor(coordinator, vin)
-        for vin, vehicle in coordinator.data.items()
-        if vehicle[ATTR_STATS].get("speed") is not None
-    )
+    metrics: BouncieMetrics = hass.data[DOMAIN][config_entry.entry_id][METRICS]
+    if metrics.enabled:
+        async_add_entities(
+            BouncieMetricSensor(metrics, config_entry, *sensor)
+            for sensor in METRIC_SENSORS
+        )
 
-    async_add_entities(entities)
+
+def _average_ms(metrics: BouncieMetrics, name: str) -> float | None:
+    """Return the average duration of a timing in milliseconds."""
+    histogram = metrics.histograms.get(name)
+    if histogram is None or (average := histogram.average) is None:
+        return None
+    return round(average * 1000, 3)
+
+
+def _minutes(seconds: float | None) -> float | None:
+    """Return seconds in minutes."""
+    return None if seconds is None else round(seconds / 60, 1)
+
+
+def _round(value: float | None) -> float | None:
+    """Return value rounded to two decimals."""
+    return None if value is None else round(value, 2)
+
+
+# Key, name, unit, device class and value of the trip sensors
+TRIP_SENSORS: tuple[
+    tuple[str, str, str | None, str | None, Callable[[TripAggregate], StateType]],
+    ...,
+] = (
+    (
+        "distance",
+        "Trip Distance",
+        LENGTH_MILES,
+        "distance",
+        lambda trip: _round(trip.distance),
+    ),
+    (
+        "duration",
+        "Trip Duration",
+        TIME_MINUTES,
+        "duration",
+        lambda trip: _minutes(trip.duration),
+    ),
+    (
+        "max_speed",
+        "Trip Max Speed",
+        SPEED_MILES_PER_HOUR,
+        "speed",
+        lambda trip: _round(trip.max_speed),
+    ),
+    (
+        "average_speed",
+        "Trip Average Speed",
+        SPEED_MILES_PER_HOUR,
+        "speed",
+        lambda trip: _round(trip.average_speed),
+    ),
+    (
+        "idle_time",
+        "Trip Idle Time",
+        TIME_MINUTES,
+        "duration",
+        lambda trip: _minutes(trip.idle_time),
+    ),
+    (
+        "hard_brakes",
+        "Trip Hard Brakes",
+        None,
+        None,
+        lambda trip: trip.hard_brakes,
+    ),
+    (
+        "hard_accelerations",
+        "Trip Hard Accelerations",
+        None,
+        None,
+        lambda trip: trip.hard_accelerations,
+    ),
+    (
+        "fuel_used",
+        "Trip Fuel Used",
+        PERCENTAGE,
+        None,
+        lambda trip: _round(trip.fuel_used),
+    ),
+)
+
+# Key, name, unit, state class and value of the diagnostic sensors
+METRIC_SENSORS: tuple[
+    tuple[str, str, str | None, str, Callable[[BouncieMetrics], StateType]], ...
+] = (
+    (
+        "webhooks",
+        "Webhooks Received",
+        None,
+        STATE_CLASS_TOTAL_INCREASING,
+        lambda metrics: metrics.counters["webhooks"],
+    ),
+    (
+        "api_requests",
+        "API Requests",
+        None,
+        STATE_CLASS_TOTAL_INCREASING,
+        lambda metrics: metrics.counters["api_requests"],
+    ),
+    (
+        "api_errors",
+        "API Errors",
+        None,
+        STATE_CLASS_TOTAL_INCREASING,
+        lambda metrics: metrics.total("api_errors."),
+    ),
+    (
+        "state_writes",
+        "State Writes",
+        None,
+        STATE_CLASS_TOTAL_INCREASING,
+        lambda metrics: metrics.counters["state_writes"],
+    ),
+    (
+        "dispatch_latency",
+        "Dispatch Latency",
+        TIME_MILLISECONDS,
+        STATE_CLASS_MEASUREMENT,
+        lambda metrics: _average_ms(metrics, "dispatch"),
+    ),
+    (
+        "api_latency",
+        "API Latency",
+        TIME_MILLISECONDS,
+        STATE_CLASS_MEASUREMENT,
+        lambda metrics: _average_ms(metrics, "api_request"),
+    ),
+)
 
 
 class BouncieOdometer(BouncieEntity, SensorEntity):
     """Representation of a Bouncie Odometer Sensor."""
 
+    _deadband = ODOMETER_DEADBAND
+
     def __init__(self, coordinator: BouncieVehiclesDataUpdateCoordinator, vin: str):
         """Initialize the sensor."""
         super().__init__(coordinator, vin)
 
         vehicle = coordinator.data[vin]
         self._attr_unique_id = f"{vin}_odometer"
-        self._attr_name = f"{vehicle[ATTR_NICKNAME]} Odometer"
+        self._attr_name = f"{vehicle.nickname} Odometer"
         self._attr_device_class = "distance"
         self._attr_state_class = STATE_CLASS_TOTAL
-        self._attr_last_reset = dt.parse_datetime(
-            f"{vehicle[ATTR_STATS]['lastUpdated']}"
-        )
+        self._attr_last_reset = vehicle.stats.last_updated
 
-        self._odometer: float = vehicle[ATTR_STATS]["odometer"]
+        self._odometer: float = vehicle.stats.odometer
 
     @property
     def native_value(self) -> float:
@@ -95,20 +270,12 @@ class BouncieOdometer(BouncieEntity, SensorEntity):
         """Return the unit of measurement of the sensor."""
         return LENGTH_MILES
 
-    async def async_event_received(self, event: Event) -> None:
-        """Update status if event received for this entity."""
-        status = event.data
-        if status[ATTR_VIN] == self.vin:
-            if status[ATTR_EVENT] == EVENT_TRIPEND:
-                self._odometer = status["end"]["odometer"]
-        self.async_write_ha_state()
-
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        vehicle = self.coordinator.data[self.vin]
-        self._odometer = vehicle[ATTR_STATS]["odometer"]
-        self.async_write_ha_state()
+        if (vehicle := self.vehicle) is not None and vehicle.stats.odometer is not None:
+            self._odometer = vehicle.stats.odometer
+        self._async_write_ha_state_if_changed()
 
 
 class BouncieFuelLevelSensor(BouncieEntity, SensorEntity):
@@ -120,10 +287,10 @@ class BouncieFuelLevelSensor(BouncieEntity, SensorEntity):
 
         vehicle = coordinator.data[vin]
         self._attr_unique_id = f"{vin}_fuelLevel"
-        self._attr_name = f"{vehicle[ATTR_NICKNAME]} Fuel Level"
+        self._attr_name = f"{vehicle.nickname} Fuel Level"
         self._attr_state_class = STATE_CLASS_MEASUREMENT
 
-        self._fuellevel: float = vehicle[ATTR_STATS]["fuelLevel"]
+        self._fuellevel: float = vehicle.stats.fuel_level
 
     @property
     def native_value(self) -> float:
@@ -135,38 +302,32 @@ class BouncieFuelLevelSensor(BouncieEntity, SensorEntity):
         """Return the unit of measurement of the sensor."""
         return PERCENTAGE
 
-    async def async_event_received(self, event: Event) -> None:
-        """Update status if event received for this entity."""
-        status = event.data
-        if status[ATTR_VIN] == self.vin and status[ATTR_EVENT] == EVENT_TRIPDATA:
-            for entry in reversed(status["data"]):
-                if (fuellevel := entry.get("fuelLevelInput")) is not None:
-                    self._fuellevel = fuellevel
-                    break
-        self.async_write_ha_state()
-
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        vehicle = self.coordinator.data[self.vin]
-        self._fuellevel = vehicle[ATTR_STATS]["fuelLevel"]
-        self.async_write_ha_state()
+        if (
+            vehicle := self.vehicle
+        ) is not None and vehicle.stats.fuel_level is not None:
+            self._fuellevel = vehicle.stats.fuel_level
+        self._async_write_ha_state_if_changed()
 
 
 class BouncieSpeedSensor(BouncieEntity, SensorEntity):
     """Representation of a Bouncie Speed Sensor."""
 
+    _deadband = SPEED_DEADBAND
+
     def __init__(self, coordinator: BouncieVehiclesDataUpdateCoordinator, vin: str):
         """Initialize the sensor."""
         super().__init__(coordinator, vin)
 
         vehicle = coordinator.data[vin]
         self._attr_unique_id = f"{vin}_speed"
-        self._attr_name = f"{vehicle[ATTR_NICKNAME]} Speed"
+        self._attr_name = f"{vehicle.nickname} Speed"
         self._attr_state_class = STATE_CLASS_MEASUREMENT
         self._attr_device_class = "speed"
 
-        self._speed: float = vehicle[ATTR_STATS]["speed"]
+        self._speed: float = vehicle.stats.speed
 
     @property
     def native_value(self) -> float:
@@ -178,17 +339,104 @@ class BouncieSpeedSensor(BouncieEntity, SensorEntity):
         """Return the unit of measurement of the sensor."""
         return SPEED_MILES_PER_HOUR
 
-    async def async_event_received(self, event: Event) -> None:
-        """Update status if event received for this entity."""
-        status = event.data
-        if status[ATTR_VIN] == self.vin:
-            if status[ATTR_EVENT] == EVENT_TRIPDATA:
-                self._speed = status[ATTR_DATA][-1]["speed"]
-        self.async_write_ha_state()
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        if (vehicle := self.vehicle) is not None and vehicle.stats.speed is not None:
+            self._speed = vehicle.stats.speed
+        self._async_write_ha_state_if_changed()
+
+
+class BouncieTripSensor(BouncieEntity, SensorEntity):
+    """Representation of a total of the current or last trip of a vehicle."""
+
+    _event_types = (EVENT_TRIPSTART, EVENT_TRIPDATA, EVENT_TRIPMETRICS, EVENT_TRIPEND)
+
+    def __init__(
+        self,
+        coordinator: BouncieVehiclesDataUpdateCoordinator,
+        vin: str,
+        key: str,
+        name: str,
+        unit: str | None,
+        device_class: str | None,
+        value_fn: Callable[[TripAggregate], StateType],
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, vin)
+
+        vehicle = coordinator.data[vin]
+        self._attr_unique_id = f"{vin}_trip_{key}"
+        self._attr_name = f"{vehicle.nickname} {name}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        self._value_fn = value_fn
+
+    @property
+    def _aggregate(self) -> TripAggregate | None:
+        """Return the totals of the current or last trip."""
+        return self.coordinator.dispatcher.trip_buffer.aggregates.get(self.vin)
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the value reported by the sensor."""
+        if (aggregate := self._aggregate) is None:
+            return None
+        return self._value_fn(aggregate)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return when the trip started and if it is still in progress."""
+        if (aggregate := self._aggregate) is None or aggregate.started is None:
+            return None
+        return {
+            "trip_start": dt.utc_from_timestamp(aggregate.started).isoformat(),
+            "in_progress": not aggregate.finished,
+        }
+
+    @callback
+    def async_event_received(self, status: dict[str, Any]) -> None:
+        """Handle trip events of this vehicle."""
+        self._async_write_ha_state_if_changed()
 
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        vehicle = self.coordinator.data[self.vin]
-        self._speed: float = vehicle[ATTR_STATS]["speed"]
-        self.async_write_ha_state()
+        self._async_write_ha_state_if_changed()
+
+
+class BouncieMetricSensor(SensorEntity):
+    """Diagnostic sensor of the instrumentation of a config entry."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(
+        self,
+        metrics: BouncieMetrics,
+        config_entry: ConfigEntry,
+        key: str,
+        name: str,
+        unit: str | None,
+        state_class: str,
+        value_fn: Callable[[BouncieMetrics], StateType],
+    ) -> None:
+        """Initialize the sensor."""
+        self._metrics = metrics
+        self._value_fn = value_fn
+        # Every entry has its own Bouncie application, named by its client ID
+        application = f"{NAME} {config_entry.data[CONF_CLIENT_ID]}"
+        self._attr_unique_id = f"{config_entry.entry_id}_{key}"
+        self._attr_name = f"{application} {name}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, config_entry.entry_id)},
+            name=application,
+            manufacturer=NAME,
+            entry_type=DeviceEntryType.SERVICE,
+        )
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the value reported by the sensor."""
+        return self._value_fn(self._metrics)
@@ -0,0 +1,630 @@
+"""Trip data handling for Bouncie."""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from logging import getLogger
+from math import cos, hypot, isnan, nan, radians
+from typing import Any, NamedTuple
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt
+
+from .api import BouncieAPI
+from .const import (
+    ATTR_DATA,
+    ATTR_END_TIME,
+    ATTR_EVENT,
+    ATTR_GPS,
+    ATTR_LAT,
+    ATTR_LON,
+    ATTR_START_TIME,
+    ATTR_TRANSACTION_ID,
+    ATTR_VIN,
+    DOMAIN,
+    EVENT_TRIPDATA,
+    EVENT_TRIPEND,
+    EVENT_TRIPMETRICS,
+    EVENT_TRIPSTART,
+    STORAGE_VERSION,
+    TRIP_BUFFER_SIZE,
+    TRIP_IDLE_SPEED,
+    TRIPS_BACKFILL,
+    TRIPS_RETENTION,
+    TRIPS_SYNC_OVERLAP,
+)
+
+_LOGGER = getLogger(__name__)
+
+SAVE_DELAY = 10
+EARTH_RADIUS = 6371000  # m
+METERS_PER_MILE = 1609.344
+
+# Trip fields kept in the local store, the GPS track is dropped
+TRIP_FIELDS = (
+    ATTR_TRANSACTION_ID,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    "timeZone",
+    "distance",
+    "startOdometer",
+    "endOdometer",
+    "averageSpeed",
+    "maxSpeed",
+    "fuelConsumed",
+    "totalIdleDuration",
+    "hardBrakingCount",
+    "hardAccelerationCount",
+)
+
+
+class TripPoint(NamedTuple):
+    """A single trip data point."""
+
+    timestamp: float
+    lat: float
+    lon: float
+    speed: float
+    fuel: float
+
+
+def _parse_point(point: dict[str, Any]) -> TripPoint | None:
+    """Parse a raw trip data point, missing values become NaN."""
+    if (timestamp := dt.parse_datetime(f"{point.get('timestamp')}")) is None:
+        return None
+    gps = point.get(ATTR_GPS) or {}
+    return TripPoint(
+        timestamp.timestamp(),
+        _float(gps.get(ATTR_LAT)),
+        _float(gps.get(ATTR_LON)),
+        _float(point.get("speed")),
+        _float(point.get("fuelLevelInput")),
+    )
+
+
+def distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return the distance in meters between nearby positions."""
+    # Equirectangular approximation, accurate over the distances of a trip
+    x = radians(lon2 - lon1) * cos(radians((lat1 + lat2) / 2))
+    y = radians(lat2 - lat1)
+    return EARTH_RADIUS * hypot(x, y)
+
+
+class PathSimplifier:
+    """Dead reckoning filter that keeps the points which change a path."""
+
+    __slots__ = ("tolerance", "max_gap")
+
+    def __init__(self, tolerance: float, max_gap: float) -> None:
+        """Initialize with a tolerance in meters and a maximum gap in seconds."""
+        self.tolerance = tolerance
+        self.max_gap = max_gap
+
+    def accept(
+        self, previous: TripPoint | None, last: TripPoint | None, point: TripPoint
+    ) -> bool:
+        """Return if point deviates from the path extrapolated from the kept points."""
+        if last is None or point.timestamp - last.timestamp >= self.max_gap:
+            return True
+        lat, lon = last.lat, last.lon
+        if previous is not None and last.timestamp > previous.timestamp:
+            scale = (point.timestamp - last.timestamp) / (
+                last.timestamp - previous.timestamp
+            )
+            lat += (last.lat - previous.lat) * scale
+            lon += (last.lon - previous.lon) * scale
+        return distance(point.lat, point.lon, lat, lon) > self.tolerance
+
+
+def _float(value: Any) -> float:
+    """Return value as float or NaN."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return nan
+
+
+class TripColumns:
+    """Time ordered columns of the trip data points of one vehicle."""
+
+    __slots__ = (
+        "timestamp",
+        "lat",
+        "lon",
+        "speed",
+        "fuel",
+        "last_position",
+        "last_speed",
+        "last_fuel",
+        "max_speed",
+        "_speed_sum",
+        "_speed_count",
+        "path_previous",
+        "path_last",
+    )
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.timestamp = array("d")
+        self.lat = array("d")
+        self.lon = array("d")
+        self.speed = array("d")
+        self.fuel = array("d")
+        self.last_position: tuple[float, float] | None = None
+        self.last_speed: float | None = None
+        self.last_fuel: float | None = None
+        self.max_speed: float | None = None
+        self._speed_sum: float = 0.0
+        self._speed_count: int = 0
+        # The last two points kept by the path simplifier
+        self.path_previous: TripPoint | None = None
+        self.path_last: TripPoint | None = None
+
+    def __len__(self) -> int:
+        """Return the number of buffered points."""
+        return len(self.timestamp)
+
+    @property
+    def average_speed(self) -> float | None:
+        """Return the average speed over all points since the trip started."""
+        if not self._speed_count:
+            return None
+        return self._speed_sum / self._speed_count
+
+    def extend(self, points: list[TripPoint], max_points: int) -> None:
+        """Add points, keeping the columns ordered by time."""
+        points.sort(key=lambda point: point.timestamp)
+        if self.timestamp and points[0].timestamp < self.timestamp[-1]:
+            self._merge(points)
+        else:
+            for point in points:
+                self.timestamp.append(point.timestamp)
+                self.lat.append(point.lat)
+                self.lon.append(point.lon)
+                self.speed.append(point.speed)
+                self.fuel.append(point.fuel)
+
+        for point in points:
+            if not isnan(point.speed):
+                self._speed_sum += point.speed
+                self._speed_count += 1
+                if self.max_speed is None or point.speed > self.max_speed:
+                    self.max_speed = point.speed
+
+        self._update_last_known(bisect_left(self.timestamp, points[0].timestamp))
+
+        if (excess := len(self) - max_points) > 0:
+            for column in (self.timestamp, self.lat, self.lon, self.speed, self.fuel):
+                del column[:excess]
+
+    def simplify(self, points: list[TripPoint], simplifier: PathSimplifier) -> None:
+        """Keep the points of a time ordered batch that change the path."""
+        for point in points:
+            if isnan(point.lat) or isnan(point.lon):
+                continue
+            if (
+                self.path_last is not None
+                and point.timestamp <= self.path_last.timestamp
+            ):
+                # Late points can not change the path that was already followed
+                continue
+            if simplifier.accept(self.path_previous, self.path_last, point):
+                self.path_previous, self.path_last = self.path_last, point
+
+    def _update_last_known(self, first: int) -> None:
+        """Update the last known values from the points at or after first."""
+        position = speed = fuel = None
+        for index in range(len(self) - 1, first - 1, -1):
+            if position is None and not isnan(self.lat[index] + self.lon[index]):
+                position = (self.lat[index], self.lon[index])
+            if speed is None and not isnan(self.speed[index]):
+                speed = self.speed[index]
+            if fuel is None and not isnan(self.fuel[index]):
+                fuel = self.fuel[index]
+            if position is not None and speed is not None and fuel is not None:
+                break
+        # Older points can not be newer than the previously known values
+        self.last_position = position or self.last_position
+        self.last_speed = self.last_speed if speed is None else speed
+        self.last_fuel = self.last_fuel if fuel is None else fuel
+
+    def _merge(self, points: list[TripPoint]) -> None:
+        """Merge late points into the columns."""
+        merged = sorted(
+            [
+                *zip(self.timestamp, self.lat, self.lon, self.speed, self.fuel),
+                *points,
+            ],
+            key=lambda point: point[0],
+        )
+        for index, column in enumerate(
+            (self.timestamp, self.lat, self.lon, self.speed, self.fuel)
+        ):
+            column[:] = array("d", (point[index] for point in merged))
+
+    def latest(self) -> TripPoint | None:
+        """Return the newest buffered point."""
+        if not self.timestamp:
+            return None
+        return TripPoint(
+            self.timestamp[-1],
+            self.lat[-1],
+            self.lon[-1],
+            self.speed[-1],
+            self.fuel[-1],
+        )
+
+    def path(self) -> list[tuple[float, float, float]]:
+        """Return the buffered (timestamp, lat, lon) points with a position."""
+        return [
+            (timestamp, lat, lon)
+            for timestamp, lat, lon in zip(self.timestamp, self.lat, self.lon)
+            if not isnan(lat) and not isnan(lon)
+        ]
+
+
+class TripAggregate:
+    """Running totals of a single trip, updated in constant time per point."""
+
+    # Fields that make up the stored totals
+    _STORED = (
+        "started",
+        "ended",
+        "finished",
+        "start_odometer",
+        "end_odometer",
+        "first_fuel",
+        "last_fuel",
+        "fuel_consumed",
+        "metrics",
+        "_distance",
+        "_idle_time",
+        "_max_speed",
+        "_speed_sum",
+        "_speed_count",
+        "_points",
+    )
+    __slots__ = (*_STORED, "_last")
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.started: float | None = None
+        self.ended: float | None = None
+        self.finished: bool = False
+        self.start_odometer: float | None = None
+        self.end_odometer: float | None = None
+        self.first_fuel: float | None = None
+        self.last_fuel: float | None = None
+        self.fuel_consumed: float | None = None
+        # Totals reported by the device in tripMetrics events
+        self.metrics: dict[str, Any] = {}
+        self._distance: float = 0.0  # m
+        self._idle_time: float = 0.0  # s
+        self._max_speed: float | None = None
+        self._speed_sum: float = 0.0
+        self._speed_count: int = 0
+        self._points: int = 0  # in time order
+        self._last: TripPoint | None = None
+
+    @property
+    def distance(self) -> float | None:
+        """Return the distance driven in miles."""
+        if self.start_odometer is not None and self.end_odometer is not None:
+            return self.end_odometer - self.start_odometer
+        if (distance := self.metrics.get("tripDistance")) is not None:
+            return distance
+        if not self._points:
+            return None
+        return self._distance / METERS_PER_MILE
+
+    @property
+    def duration(self) -> float | None:
+        """Return the duration of the trip in seconds."""
+        if self.started is None or self.ended is None:
+            return self.metrics.get("tripTime")
+        return self.ended - self.started
+
+    @property
+    def max_speed(self) -> float | None:
+        """Return the highest speed."""
+        speeds = [
+            speed
+            for speed in (self._max_speed, self.metrics.get("maxSpeed"))
+            if speed is not None
+        ]
+        return max(speeds, default=None)
+
+    @property
+    def average_speed(self) -> float | None:
+        """Return the average speed while driving."""
+        if (speed := self.metrics.get("averageDriveSpeed")) is not None:
+            return speed
+        if not self._speed_count:
+            return None
+        return self._speed_sum / self._speed_count
+
+    @property
+    def idle_time(self) -> float | None:
+        """Return the time spent idling in seconds."""
+        if (idle_time := self.metrics.get("totalIdlingTime")) is not None:
+            return idle_time
+        return self._idle_time if self._points else None
+
+    @property
+    def hard_brakes(self) -> int:
+        """Return the number of hard brakes."""
+        return self.metrics.get("hardBrakingCounts", 0)
+
+    @property
+    def hard_accelerations(self) -> int:
+        """Return the number of hard accelerations."""
+        return self.metrics.get("hardAccelerationCounts", 0)
+
+    @property
+    def fuel_used(self) -> float | None:
+        """Return the fuel used in percent of the tank."""
+        if self.first_fuel is None or self.last_fuel is None:
+            return None
+        return max(self.first_fuel - self.last_fuel, 0.0)
+
+    def start(self, section: dict[str, Any] | None) -> None:
+        """Start the trip from the start section of a tripStart event."""
+        section = section or {}
+        self.started = _timestamp(section.get("timestamp"))
+        self.start_odometer = section.get("odometer")
+
+    def add(self, points: list[TripPoint]) -> None:
+        """Add time ordered points."""
+        for point in points:
+            if self.started is not None and point.timestamp < self.started:
+                continue
+            last = self._last
+            if last is not None and point.timestamp <= last.timestamp:
+                # Late points would count twice or undo the newest fuel level
+                continue
+            if not isnan(point.speed):
+                self._speed_sum += point.speed
+                self._speed_count += 1
+                if self._max_speed is None or point.speed > self._max_speed:
+                    self._max_speed = point.speed
+            if not isnan(point.fuel):
+                if self.first_fuel is None:
+                    self.first_fuel = point.fuel
+                self.last_fuel = point.fuel
+            if last is not None:
+                if not isnan(last.lat + last.lon + point.lat + point.lon):
+                    self._distance += distance(last.lat, last.lon, point.lat, point.lon)
+                if not isnan(last.speed) and last.speed < TRIP_IDLE_SPEED:
+                    self._idle_time += point.timestamp - last.timestamp
+            self._last = point
+            self._points += 1
+            self.ended = max(self.ended or point.timestamp, point.timestamp)
+
+    def update_metrics(self, metrics: dict[str, Any] | None) -> None:
+        """Take the totals of a tripMetrics event."""
+        if metrics:
+            self.metrics.update(metrics)
+
+    def finish(self, section: dict[str, Any] | None) -> None:
+        """Finish the trip from the end section of a tripEnd event."""
+        section = section or {}
+        if (ended := _timestamp(section.get("timestamp"))) is not None:
+            self.ended = ended
+        self.end_odometer = section.get("odometer")
+        self.fuel_consumed = section.get("fuelConsumed")
+        self.finished = True
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the totals to store."""
+        return {key.lstrip("_"): getattr(self, key) for key in self._STORED}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> TripAggregate:
+        """Restore stored totals."""
+        aggregate = cls()
+        for key in cls._STORED:
+            if (value := data.get(key.lstrip("_"))) is not None:
+                setattr(aggregate, key, value)
+        return aggregate
+
+
+def _timestamp(value: Any) -> float | None:
+    """Return an ISO 8601 timestamp as seconds since the epoch."""
+    if (parsed := dt.parse_datetime(f"{value}")) is None:
+        return None
+    return parsed.timestamp()
+
+
+class BouncieTripBuffer:
+    """Parse trip data webhooks once into per vehicle columns."""
+
+    def __init__(
+        self,
+        max_points: int = TRIP_BUFFER_SIZE,
+        simplifier: PathSimplifier | None = None,
+    ) -> None:
+        """Initialize."""
+        self._max_points = max_points
+        self.simplifier = simplifier
+        self._vehicles: dict[str, TripColumns] = {}
+        # Totals of the current or last finished trip per vehicle
+        self.aggregates: dict[str, TripAggregate] = {}
+
+    def __getitem__(self, vin: str) -> TripColumns:
+        """Return the columns of a vehicle."""
+        if (columns := self._vehicles.get(vin)) is None:
+            columns = self._vehicles[vin] = TripColumns()
+        return columns
+
+    def __contains__(self, vin: str) -> bool:
+        """Return if points have been buffered for a vehicle."""
+        return vin in self._vehicles
+
+    @callback
+    def async_ingest(self, status: dict[str, Any]) -> None:
+        """Ingest a webhook event."""
+        event_type = status[ATTR_EVENT]
+        vin = status[ATTR_VIN]
+        if event_type == EVENT_TRIPSTART:
+            self._vehicles.pop(vin, None)
+            aggregate = self.aggregates[vin] = TripAggregate()
+            aggregate.start(status.get("start"))
+        elif event_type == EVENT_TRIPDATA:
+            points = [
+                point
+                for raw in status.get(ATTR_DATA) or ()
+                if (point := _parse_point(raw)) is not None
+            ]
+            if points:
+                columns = self[vin]
+                columns.extend(points, self._max_points)
+                if self.simplifier is not None:
+                    columns.simplify(points, self.simplifier)
+                if (
+                    aggregate := self._aggregate(vin, points[-1].timestamp)
+                ) is not None:
+                    aggregate.add(points)
+        elif event_type == EVENT_TRIPMETRICS:
+            metrics = status.get("metrics") or {}
+            timestamp = _timestamp(metrics.get("timestamp"))
+            if (aggregate := self._aggregate(vin, timestamp)) is not None:
+                aggregate.update_metrics(metrics)
+        elif event_type == EVENT_TRIPEND:
+            end = status.get("end") or {}
+            timestamp = _timestamp(end.get("timestamp"))
+            if (aggregate := self._aggregate(vin, timestamp)) is not None:
+                aggregate.finish(end)
+
+    def _aggregate(self, vin: str, timestamp: float | None) -> TripAggregate | None:
+        """Return the totals of the trip of a vehicle an event belongs to."""
+        aggregate = self.aggregates.get(vin)
+        if aggregate is None or (
+            aggregate.finished
+            and timestamp is not None
+            and timestamp > (aggregate.ended or 0.0)
+        ):
+            # The start of this trip was missed
+            aggregate = self.aggregates[vin] = TripAggregate()
+        if aggregate.finished:
+            # Late event of a trip whose totals are final
+            return None
+        return aggregate
+
+
+class BouncieTripStore:
+    """Local trip history, synced incrementally from the trips API."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, api: BouncieAPI) -> None:
+        """Initialize."""
+        self.api = api
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.trips")
+        self._synced: dict[str, str] = {}
+        self._trips: dict[str, dict[str, dict[str, Any]]] = {}
+        self._aggregates: dict[str, dict[str, Any]] = {}
+        self._save_pending: bool = False
+
+    async def async_load(self) -> None:
+        """Load the trip history from disk."""
+        if (data := await self._store.async_load()) is None:
+            return
+        self._synced = data["synced"]
+        self._trips = {
+            imei: {trip[ATTR_TRANSACTION_ID]: trip for trip in trips}
+            for imei, trips in data["trips"].items()
+        }
+        self._aggregates = data.get("aggregates", {})
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        """Return the data to store."""
+        self._save_pending = False
+        return {
+            "synced": self._synced,
+            "trips": {
+                imei: list(trips.values()) for imei, trips in self._trips.items()
+            },
+            "aggregates": self._aggregates,
+        }
+
+    @callback
+    def _async_delay_save(self) -> None:
+        """Save the data after a delay, to write a burst of changes at once."""
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    async def async_flush(self) -> None:
+        """Write a pending save to disk."""
+        if self._save_pending:
+            await self._store.async_save(self._data_to_save())
+
+    def aggregates(self) -> dict[str, TripAggregate]:
+        """Return the totals of the last finished trip per vehicle."""
+        return {
+            vin: TripAggregate.from_dict(data) for vin, data in self._aggregates.items()
+        }
+
+    @callback
+    def async_save_aggregate(self, vin: str, aggregate: TripAggregate) -> None:
+        """Save the totals of a finished trip."""
+        self._aggregates[vin] = aggregate.as_dict()
+        self._async_delay_save()
+
+    def trips(self, imei: str) -> list[dict[str, Any]]:
+        """Return the stored trips of a device, ordered by start time."""
+        return sorted(
+            self._trips.get(imei, {}).values(), key=lambda trip: trip[ATTR_START_TIME]
+        )
+
+    def synced(self, imei: str) -> str | None:
+        """Return the time the next sync of a device starts at."""
+        return self._synced.get(imei)
+
+    async def async_sync(self, imei: str) -> None:
+        """Fetch the trips of a device that were not synced yet."""
+        now = dt.utcnow()
+        start = now - TRIPS_BACKFILL
+        if (synced := self._synced.get(imei)) is not None:
+            start = dt.parse_datetime(synced) or start
+
+        trips = self._trips.setdefault(imei, {})
+        changed = False
+        try:
+            async for window_end, window_trips in self.api.async_iter_trips(
+                imei, start, now
+            ):
+                last_end = start
+                for trip in window_trips:
+                    stored = {key: trip[key] for key in TRIP_FIELDS if key in trip}
+                    if trips.get(trip[ATTR_TRANSACTION_ID]) != stored:
+                        trips[trip[ATTR_TRANSACTION_ID]] = stored
+                        changed = True
+                    if (
+                        end := dt.parse_datetime(f"{trip.get(ATTR_END_TIME)}")
+                    ) is not None:
+                        last_end = max(last_end, end)
+                # Trips crossing the window end come with the next window or sync
+                start = max(last_end, window_end - TRIPS_SYNC_OVERLAP)
+                if self._synced.get(imei) != (synced := start.isoformat()):
+                    self._synced[imei] = synced
+                    changed = True
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning("Unable to sync trips of %s: %s", imei, err)
+
+        if self._async_prune(imei, now) or changed:
+            self._async_delay_save()
+
+    @callback
+    def _async_prune(self, imei: str, now: datetime) -> bool:
+        """Drop trips older than the retention period, return if any were."""
+        oldest = (now - TRIPS_RETENTION).isoformat()
+        trips = self._trips.get(imei, {})
+        expired = [
+            transaction_id
+            for transaction_id, trip in trips.items()
+            if trip.get(ATTR_START_TIME, oldest) < oldest
+        ]
+        for transaction_id in expired:
+            del trips[transaction_id]
+        return bool(expired)
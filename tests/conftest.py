@@ -1,9 +1,15 @@
 """Global fixtures for bouncie integration."""
+from typing import Any, Awaitable, Callable
 from unittest.mock import patch
 
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
 import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
 
-from .const import MOCK_VEHICLE
+from custom_components.bouncie.const import DOMAIN
+
+from .const import MOCK_CONFIG, MOCK_ENTRY, MOCK_VEHICLE
 
 pytest_plugins = "pytest_homeassistant_custom_component"
 
@@ -22,9 +28,27 @@ def auto_enable_custom_integrations(enable_custom_integrations):
 
 @pytest.fixture(name="bypass_get_vehicles")
 def bypass_get_vehicles_fixture():
-    """Mock calls to api.async_get_vehicles."""
+    """Mock calls to api.async_get_vehicles and skip the trip sync."""
     with patch(
         "custom_components.bouncie.BouncieAPI.async_get_vehicles",
         return_value=[MOCK_VEHICLE],
+    ) as mock_get_vehicles, patch(
+        "custom_components.bouncie.BouncieTripStore.async_sync"
     ):
-        yield
+        yield mock_get_vehicles
+
+
+@pytest.fixture(name="setup_entry")
+def setup_entry_fixture(
+    hass: HomeAssistant,
+) -> Callable[..., Awaitable[MockConfigEntry]]:
+    """Return a function that adds a config entry and sets up the integration."""
+
+    async def _setup_entry(**kwargs: Any) -> MockConfigEntry:
+        entry = MockConfigEntry(domain=DOMAIN, data=dict(MOCK_ENTRY.data), **kwargs)
+        entry.add_to_hass(hass)
+        assert await async_setup_component(hass, DOMAIN, {DOMAIN: MOCK_CONFIG})
+        await hass.async_block_till_done()
+        return entry
+
+    return _setup_entry
@@ -0,0 +1,270 @@
+"""Local stand-in for the Bouncie API and a webhook emitter for load tests.
+
+FakeBouncie serves the user, vehicles, trips and token endpoints with a
+configurable fleet size, latency, error rate and throttling. The vehicles
+endpoint answers conditional requests with an ETag. Use patch_urls
+to point the integration at it. WebhookEmitter replays recorded drives into
+the webhook view, see fixtures/drive.jsonl for the format.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from copy import deepcopy
+from datetime import datetime, timedelta
+from hashlib import md5
+from http import HTTPStatus
+import json
+from pathlib import Path
+import random
+from typing import Any, Awaitable, Callable, Iterator
+from unittest.mock import patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from homeassistant.util import dt
+
+from custom_components.bouncie.const import ATTR_IMEI, ATTR_VIN, CONF_CLIENT_ID
+from custom_components.bouncie.dispatcher import event_timestamp
+
+from .const import MOCK_CONFIG, MOCK_VEHICLE
+
+DRIVE_FIXTURE = Path(__file__).parent / "fixtures" / "drive.jsonl"
+
+# Module attributes that hold the URLs of the Bouncie services
+URL_TARGETS = {
+    "custom_components.bouncie.api.USER_URL": "/v1/user",
+    "custom_components.bouncie.api.VEHICLES_URL": "/v1/vehicles",
+    "custom_components.bouncie.api.TRIPS_URL": "/v1/trips",
+    "custom_components.bouncie.OAUTH2_TOKEN": "/oauth/token",
+    "custom_components.bouncie.config_flow.OAUTH2_TOKEN": "/oauth/token",
+}
+
+
+class FakeBouncie:
+    """Serve the Bouncie API endpoints from a local aiohttp server."""
+
+    def __init__(
+        self,
+        fleet_size: int = 1,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        trips_per_day: int = 2,
+        trip_length: timedelta = timedelta(minutes=30),
+        seed: int = 0,
+    ) -> None:
+        """Initialize."""
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.trips_per_day = trips_per_day
+        self.trip_length = trip_length
+        self.vehicles = [fleet_vehicle(index) for index in range(fleet_size)]
+        self.access_token = "fake-0"
+        # Requests per path and response status
+        self.requests: Counter[tuple[str, int]] = Counter()
+        self._random = random.Random(seed)
+        self._tokens_issued = 0
+        self._server: TestServer | None = None
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.add_routes(
+            [
+                web.get("/v1/user", self._handle_user),
+                web.get("/v1/vehicles", self._handle_vehicles),
+                web.get("/v1/trips", self._handle_trips),
+                web.post("/oauth/token", self._handle_token),
+            ]
+        )
+
+    def url(self, path: str) -> str:
+        """Return the URL of a path on the running server."""
+        assert self._server is not None, "Server is not started"
+        return str(self._server.make_url(path))
+
+    async def async_start(self) -> None:
+        """Start the server."""
+        self._server = TestServer(self.app, host="127.0.0.1")
+        await self._server.start_server()
+
+    async def async_stop(self) -> None:
+        """Stop the server."""
+        if self._server is not None:
+            await self._server.close()
+            self._server = None
+
+    @contextmanager
+    def patch_urls(self) -> Iterator[None]:
+        """Point the integration at the running server."""
+        with ExitStack() as stack:
+            for target, path in URL_TARGETS.items():
+                stack.enter_context(patch(target, self.url(path)))
+            yield
+
+    @web.middleware
+    async def _middleware(
+        self,
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        """Apply latency, and throttling, errors and authorization to the API."""
+        if self.latency:
+            await asyncio.sleep(self._random.uniform(0, 2 * self.latency))
+        if not request.path.startswith("/v1/"):
+            resp: web.StreamResponse = await handler(request)
+        elif self._random.random() < self.throttle_rate:
+            resp = web.Response(
+                status=HTTPStatus.TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        elif self._random.random() < self.error_rate:
+            resp = web.Response(status=HTTPStatus.SERVICE_UNAVAILABLE)
+        elif request.headers.get("Authorization") != self.access_token:
+            resp = web.Response(status=HTTPStatus.UNAUTHORIZED)
+        else:
+            resp = await handler(request)
+        self.requests[(request.path, resp.status)] += 1
+        return resp
+
+    async def _handle_user(self, _: web.Request) -> web.Response:
+        """Return the user."""
+        return web.json_response(
+            {"id": "fake", "email": "fake@example.com", "name": "Fake"}
+        )
+
+    async def _handle_vehicles(self, request: web.Request) -> web.Response:
+        """Return the fleet, not modified if the ETag matches."""
+        body = json.dumps(self.vehicles).encode()
+        etag = f'"{md5(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=HTTPStatus.NOT_MODIFIED, headers={"ETag": etag})
+        return web.Response(
+            body=body, content_type="application/json", headers={"ETag": etag}
+        )
+
+    async def _handle_trips(self, request: web.Request) -> web.Response:
+        """Return trips of a device within the requested window."""
+        imei = request.query["imei"]
+        start = dt.parse_datetime(request.query["starts-after"])
+        end = dt.parse_datetime(request.query["ends-before"])
+        if start is None or end is None or end - start > timedelta(days=7):
+            return web.Response(status=HTTPStatus.BAD_REQUEST)
+        if imei not in {vehicle[ATTR_IMEI] for vehicle in self.vehicles}:
+            return web.json_response([])
+        return web.json_response(
+            _trips(imei, start, end, self.trips_per_day, self.trip_length)
+        )
+
+    async def _handle_token(self, request: web.Request) -> web.Response:
+        """Issue a new access token."""
+        data = await request.post()
+        if data.get("client_id") != MOCK_CONFIG[CONF_CLIENT_ID]:
+            return web.Response(status=HTTPStatus.UNAUTHORIZED)
+        self._tokens_issued += 1
+        self.access_token = f"fake-{self._tokens_issued}"
+        return web.json_response(
+            {
+                "access_token": self.access_token,
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            }
+        )
+
+
+def fleet_vehicle(index: int) -> dict[str, Any]:
+    """Return a vehicle of the fleet built from MOCK_VEHICLE."""
+    vehicle = deepcopy(MOCK_VEHICLE)
+    vehicle[ATTR_VIN] = f"{MOCK_VEHICLE[ATTR_VIN][:-5]}{index:05}"
+    vehicle[ATTR_IMEI] = f"{index:015}"
+    return vehicle
+
+
+def _trips(
+    imei: str, start: datetime, end: datetime, per_day: int, length: timedelta
+) -> list[dict[str, Any]]:
+    """Return trips at fixed times of day that started and ended within the window."""
+    trips = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end:
+        for number in range(per_day):
+            started = day + timedelta(hours=8 + 10 * number / max(per_day, 1))
+            if not start < started < end - length:
+                continue
+            trips.append(
+                {
+                    "transactionId": f"{imei}-{int(started.timestamp())}",
+                    "startTime": started.isoformat(),
+                    "endTime": (started + length).isoformat(),
+                    "timeZone": "-0500",
+                    "distance": 12.3,
+                    "averageSpeed": 24.6,
+                    "maxSpeed": 55.0,
+                    "fuelConsumed": 0.5,
+                    "gps": "",
+                }
+            )
+        day += timedelta(days=1)
+    return trips
+
+
+def load_drive(path: Path = DRIVE_FIXTURE) -> list[dict[str, Any]]:
+    """Load a recorded drive, one webhook event per line."""
+    with path.open(encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class WebhookEmitter:
+    """Replay recorded drives into the webhook of a config entry."""
+
+    def __init__(
+        self,
+        session: Any,
+        url: str,
+        client_id: str = MOCK_CONFIG[CONF_CLIENT_ID],
+        speedup: float = 0.0,
+    ) -> None:
+        """Initialize, a speedup of 0 sends the events without delay."""
+        self.session = session
+        self.url = url
+        self.client_id = client_id
+        self.speedup = speedup
+        self.sent: int = 0
+        self.failed: int = 0
+
+    async def async_replay(
+        self, events: list[dict[str, Any]], vehicle: dict[str, Any] | None = None
+    ) -> None:
+        """Send the events of a drive, as the given vehicle if any."""
+        previous: float | None = None
+        for event in events:
+            if vehicle is not None:
+                event = {
+                    **event,
+                    ATTR_VIN: vehicle[ATTR_VIN],
+                    ATTR_IMEI: vehicle[ATTR_IMEI],
+                }
+            timestamp = event_timestamp(event)
+            if self.speedup and previous and timestamp > previous:
+                await asyncio.sleep((timestamp - previous) / self.speedup)
+            previous = timestamp or previous
+            resp = await self.session.post(
+                self.url,
+                data=json.dumps(event),
+                headers={"Authorization": self.client_id},
+            )
+            if resp.status == HTTPStatus.OK:
+                self.sent += 1
+            else:
+                self.failed += 1
+            resp.release()
+
+    async def async_replay_fleet(
+        self, events: list[dict[str, Any]], vehicles: list[dict[str, Any]]
+    ) -> None:
+        """Replay the same drive for every vehicle at the same time."""
+        await asyncio.gather(
+            *(self.async_replay(events, vehicle) for vehicle in vehicles)
+        )
@@ -1,13 +1,17 @@
 """Test bouncie API."""
+import asyncio
+from datetime import datetime, timedelta, timezone
 from http import HTTPStatus
 from unittest.mock import patch
 
 from homeassistant.helpers import config_entry_oauth2_flow
+from homeassistant.util import dt
+from pytest_homeassistant_custom_component.common import MockConfigEntry
 from pytest_homeassistant_custom_component.test_util.aiohttp import (
     AiohttpClientMockResponse,
 )
 
-from custom_components.bouncie.api import BouncieAPI
+from custom_components.bouncie.api import BouncieAPI, BouncieSession
 from custom_components.bouncie.common import BouncieOAuth2Implementation
 from custom_components.bouncie.const import (
     CONF_API_KEY,
@@ -16,10 +20,12 @@ from custom_components.bouncie.const import (
     DOMAIN,
     OAUTH2_AUTHORIZE,
     OAUTH2_TOKEN,
+    TRIPS_MAX_WINDOW,
     VEHICLES_URL,
 )
 
 from .const import MOCK_ENTRY, MOCK_VEHICLE
+from .fake_bouncie import FakeBouncie
 
 
 async def test_api(hass):
@@ -49,3 +55,140 @@ async def test_api(hass):
         ),
     ):
         await api.async_get_vehicles()
+
+
+async def test_api_retry(hass):
+    """Test API retries throttled requests."""
+    MOCK_ENTRY.add_to_hass(hass)
+    implementation = BouncieOAuth2Implementation(
+        hass,
+        DOMAIN,
+        MOCK_ENTRY.data[CONF_CLIENT_ID],
+        MOCK_ENTRY.data[CONF_CLIENT_SECRET],
+        MOCK_ENTRY.data[CONF_API_KEY],
+        OAUTH2_AUTHORIZE,
+        OAUTH2_TOKEN,
+    )
+    api = BouncieAPI(
+        config_entry_oauth2_flow.OAuth2Session(hass, MOCK_ENTRY, implementation)
+    )
+
+    with patch(
+        "homeassistant.helpers.config_entry_oauth2_flow.OAuth2Session.async_request",
+        side_effect=[
+            AiohttpClientMockResponse(
+                "get",
+                VEHICLES_URL,
+                status=HTTPStatus.TOO_MANY_REQUESTS,
+                headers={"Retry-After": "1"},
+            ),
+            AiohttpClientMockResponse(
+                "get",
+                VEHICLES_URL,
+                status=HTTPStatus.OK,
+                json=[MOCK_VEHICLE],
+            ),
+        ],
+    ) as mock_request, patch(
+        "custom_components.bouncie.api.asyncio.sleep"
+    ) as mock_sleep:
+        assert await api.async_get_vehicles() == [MOCK_VEHICLE]
+
+    assert mock_request.call_count == 2
+    mock_sleep.assert_called_once_with(1.0)
+
+
+async def test_api_fake_server(hass, socket_enabled):
+    """Test the HTTP path, token refresh and retries against a local server."""
+    server = FakeBouncie(fleet_size=3, throttle_rate=0.2, error_rate=0.2, seed=1)
+    await server.async_start()
+    entry = MockConfigEntry(domain=DOMAIN, data=dict(MOCK_ENTRY.data))
+    entry.add_to_hass(hass)
+
+    with server.patch_urls(), patch("custom_components.bouncie.api.asyncio.sleep"):
+        implementation = BouncieOAuth2Implementation(
+            hass,
+            DOMAIN,
+            entry.data[CONF_CLIENT_ID],
+            entry.data[CONF_CLIENT_SECRET],
+            entry.data[CONF_API_KEY],
+            OAUTH2_AUTHORIZE,
+            server.url("/oauth/token"),
+        )
+        api = BouncieAPI(BouncieSession(hass, entry, implementation))
+        vehicles = await api.async_get_vehicles()
+        trips = await api.async_get_trips(
+            vehicles[0]["imei"], dt.utcnow() - timedelta(days=10), dt.utcnow()
+        )
+    await server.async_stop()
+
+    assert vehicles == server.vehicles
+    assert trips
+    # The expired token was refreshed before the first request
+    assert entry.data["token"]["access_token"] == server.access_token
+    assert any(status != HTTPStatus.OK for _, status in server.requests)
+
+
+async def test_api_trips_window_boundary(hass, socket_enabled):
+    """Test a trip that ends in the next request window is fetched once."""
+    server = FakeBouncie(trips_per_day=1, trip_length=timedelta(hours=18))
+    await server.async_start()
+    entry = MockConfigEntry(domain=DOMAIN, data=dict(MOCK_ENTRY.data))
+    entry.add_to_hass(hass)
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+    with server.patch_urls():
+        implementation = BouncieOAuth2Implementation(
+            hass,
+            DOMAIN,
+            entry.data[CONF_CLIENT_ID],
+            entry.data[CONF_CLIENT_SECRET],
+            entry.data[CONF_API_KEY],
+            OAUTH2_AUTHORIZE,
+            server.url("/oauth/token"),
+        )
+        api = BouncieAPI(BouncieSession(hass, entry, implementation))
+        trips = await api.async_get_trips(
+            server.vehicles[0]["imei"],
+            start,
+            start + TRIPS_MAX_WINDOW + timedelta(days=1),
+        )
+    await server.async_stop()
+
+    # A trip every morning, the one of the last day ends after the range
+    transaction_ids = [trip["transactionId"] for trip in trips]
+    assert len(transaction_ids) == len(set(transaction_ids)) == 7
+    # The trip of the 7th ends after the first window of 7 days
+    straddling = datetime(2022, 1, 7, 8, tzinfo=timezone.utc).isoformat()
+    assert straddling in {trip["startTime"] for trip in trips}
+
+
+async def test_api_single_flight(hass, socket_enabled):
+    """Test concurrent requests share one token refresh and one response."""
+    server = FakeBouncie(fleet_size=2)
+    await server.async_start()
+    entry = MockConfigEntry(domain=DOMAIN, data=dict(MOCK_ENTRY.data))
+    entry.add_to_hass(hass)
+
+    with server.patch_urls():
+        implementation = BouncieOAuth2Implementation(
+            hass,
+            DOMAIN,
+            entry.data[CONF_CLIENT_ID],
+            entry.data[CONF_CLIENT_SECRET],
+            entry.data[CONF_API_KEY],
+            OAUTH2_AUTHORIZE,
+            server.url("/oauth/token"),
+        )
+        api = BouncieAPI(BouncieSession(hass, entry, implementation))
+        results = await asyncio.gather(
+            api.async_get_vehicles(), api.async_get_vehicles(), api.async_get_user()
+        )
+    await server.async_stop()
+
+    assert results[0] is results[1]
+    assert server.requests == {
+        ("/oauth/token", HTTPStatus.OK): 1,
+        ("/v1/vehicles", HTTPStatus.OK): 1,
+        ("/v1/user", HTTPStatus.OK): 1,
+    }
@@ -0,0 +1,203 @@
+"""Benchmark bouncie webhook throughput and entity fan-out.
+
+Skipped unless BOUNCIE_BENCHMARK is set:
+
+    BOUNCIE_BENCHMARK=1 pytest tests/test_benchmark.py -s
+
+The size of the run is set with BOUNCIE_BENCHMARK_VEHICLES, _WEBHOOKS,
+_BATCH_SIZE and _CONCURRENCY. Results are written to BOUNCIE_BENCHMARK_OUTPUT
+(benchmark.json in the pytest temporary directory by default) and compared
+against the results in BOUNCIE_BENCHMARK_BASELINE, if set:
+
+    BOUNCIE_BENCHMARK=1 BOUNCIE_BENCHMARK_OUTPUT=before.json pytest ...
+    BOUNCIE_BENCHMARK=1 BOUNCIE_BENCHMARK_BASELINE=before.json pytest ...
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import json
+import os
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter
+import tracemalloc
+from typing import Any
+
+from homeassistant.components.webhook import URL_WEBHOOK_PATH
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import Event, HomeAssistant
+from homeassistant.setup import async_setup_component
+import pytest
+
+from custom_components.bouncie.const import (
+    ATTR_DATA,
+    ATTR_EVENT,
+    ATTR_IMEI,
+    ATTR_TRANSACTION_ID,
+    ATTR_VIN,
+    CONF_CLIENT_ID,
+    CONF_COALESCE_WINDOW,
+    CONF_WEBHOOK_ID,
+    DOMAIN,
+    EVENT_TRIPDATA,
+    EVENT_TRIPEND,
+    EVENT_TRIPSTART,
+    WEBHOOK_QUEUE,
+)
+
+from .const import MOCK_CONFIG
+from .fake_bouncie import fleet_vehicle
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("BOUNCIE_BENCHMARK"), reason="BOUNCIE_BENCHMARK is not set"
+)
+
+VEHICLES = int(os.environ.get("BOUNCIE_BENCHMARK_VEHICLES", "10"))
+WEBHOOKS = int(os.environ.get("BOUNCIE_BENCHMARK_WEBHOOKS", "2000"))
+BATCH_SIZE = int(os.environ.get("BOUNCIE_BENCHMARK_BATCH_SIZE", "15"))
+CONCURRENCY = int(os.environ.get("BOUNCIE_BENCHMARK_CONCURRENCY", "10"))
+OUTPUT = os.environ.get("BOUNCIE_BENCHMARK_OUTPUT")
+BASELINE = os.environ.get("BOUNCIE_BENCHMARK_BASELINE")
+START = datetime(2022, 1, 1, 12, 1, tzinfo=timezone.utc)
+
+
+def _timestamp(seconds: int) -> str:
+    """Return the webhook timestamp a number of seconds after START."""
+    return (START + timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _webhooks(vehicles: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Return a trip of every vehicle, WEBHOOKS events in total."""
+    per_vehicle = max(WEBHOOKS // len(vehicles), 3)
+    trips = []
+    for vehicle in vehicles:
+        trip = {
+            ATTR_VIN: vehicle[ATTR_VIN],
+            ATTR_IMEI: vehicle[ATTR_IMEI],
+            ATTR_TRANSACTION_ID: f"{vehicle[ATTR_IMEI]}-1",
+        }
+        events = [
+            {
+                **trip,
+                ATTR_EVENT: EVENT_TRIPSTART,
+                "start": {"timestamp": _timestamp(0), "odometer": 123456.8},
+            }
+        ]
+        for batch in range(per_vehicle - 2):
+            events.append(
+                {
+                    **trip,
+                    ATTR_EVENT: EVENT_TRIPDATA,
+                    ATTR_DATA: [
+                        {
+                            "timestamp": _timestamp(second),
+                            "speed": 20 + second % 40,
+                            "fuelLevelInput": 98 - second / 1000,
+                            "gps": {
+                                "lat": 1.2345 + second / 10000,
+                                "lon": 6.789 + second / 10000,
+                            },
+                        }
+                        for second in range(
+                            batch * BATCH_SIZE + 1, (batch + 1) * BATCH_SIZE + 1
+                        )
+                    ],
+                }
+            )
+        events.append(
+            {
+                **trip,
+                ATTR_EVENT: EVENT_TRIPEND,
+                "end": {
+                    "timestamp": _timestamp(per_vehicle * BATCH_SIZE),
+                    "odometer": 123470.2,
+                },
+            }
+        )
+        trips.append(events)
+    # Interleave the trips like concurrent vehicles would
+    return [event for events in zip(*trips) for event in events]
+
+
+def _compare(results: dict[str, Any], baseline: dict[str, Any]) -> None:
+    """Print the change of every result relative to the baseline."""
+    for key, value in results.items():
+        if isinstance(previous := baseline.get(key), (int, float)) and previous:
+            print(f"{key}: {value} ({(value - previous) / previous:+.1%})")
+        else:
+            print(f"{key}: {value}")
+
+
+async def test_webhook_throughput(
+    hass: HomeAssistant,
+    hass_client_no_auth,
+    tmp_path: Path,
+    bypass_get_vehicles,
+    setup_entry,
+) -> None:
+    """Measure webhook handling from the webhook to the entity state writes."""
+    vehicles = [fleet_vehicle(index) for index in range(VEHICLES)]
+    webhooks = [json.dumps(webhook).encode() for webhook in _webhooks(vehicles)]
+    assert await async_setup_component(hass, "http", {})
+    bypass_get_vehicles.return_value = vehicles
+    entry = await setup_entry(
+        # Merging trip data would hide the cost of a single webhook
+        options={CONF_COALESCE_WINDOW: 0},
+        entry_id="benchmark",
+    )
+
+    state_writes = 0
+
+    def _count_state_write(_: Event) -> None:
+        nonlocal state_writes
+        state_writes += 1
+
+    hass.bus.async_listen(EVENT_STATE_CHANGED, _count_state_write)
+    queue = hass.data[DOMAIN][entry.entry_id][WEBHOOK_QUEUE]
+    client = await hass_client_no_auth()
+    url = URL_WEBHOOK_PATH.format(webhook_id=entry.data[CONF_WEBHOOK_ID])
+    headers = {"Authorization": MOCK_CONFIG[CONF_CLIENT_ID]}
+    latencies: list[float] = []
+
+    async def _post(body: bytes) -> None:
+        started = perf_counter()
+        resp = await client.post(url, data=body, headers=headers)
+        assert resp.status == 200
+        latencies.append(perf_counter() - started)
+
+    tracemalloc.start()
+    started = perf_counter()
+    for index in range(0, len(webhooks), CONCURRENCY):
+        await asyncio.gather(
+            *(_post(body) for body in webhooks[index : index + CONCURRENCY])
+        )
+    while queue.processed < queue.enqueued:
+        await asyncio.sleep(0.001)
+    await hass.async_block_till_done()
+    elapsed = perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    percentiles = quantiles(latencies, n=100)
+    p50, p99 = percentiles[49], percentiles[98]
+    results = {
+        "vehicles": VEHICLES,
+        "webhooks": len(webhooks),
+        "batch_size": BATCH_SIZE,
+        "concurrency": CONCURRENCY,
+        "requests_per_second": round(len(webhooks) / elapsed, 1),
+        "latency_p50_ms": round(p50 * 1000, 3),
+        "latency_p99_ms": round(p99 * 1000, 3),
+        "queue_latency_max_ms": round(queue.max_latency * 1000, 3),
+        "state_writes_per_webhook": round(state_writes / len(webhooks), 3),
+        "peak_memory_kb": round(peak_memory / 1024, 1),
+    }
+
+    if BASELINE is not None and (baseline := Path(BASELINE)).exists():
+        _compare(results, json.loads(baseline.read_text()))
+    else:
+        _compare(results, {})
+    output = Path(OUTPUT) if OUTPUT is not None else tmp_path / "benchmark.json"
+    output.write_text(json.dumps(results, indent=4) + "\n")
+
+    assert queue.dropped == 0
+    assert await hass.config_entries.async_unload(entry.entry_id)
@@ -0,0 +1,227 @@
+"""Test bouncie common functions."""
+import asyncio
+from copy import deepcopy
+from functools import partial
+from http import HTTPStatus
+from unittest.mock import patch
+
+from aiohttp import ClientError
+from homeassistant.components.webhook import URL_WEBHOOK_PATH
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+import pytest
+
+from custom_components.bouncie.common import parse_webhook
+from custom_components.bouncie.const import (
+    ATTR_EVENT,
+    ATTR_IMEI,
+    ATTR_VIN,
+    CONF_COALESCE_WINDOW,
+    CONF_WEBHOOK_ID,
+    DOMAIN,
+    EVENT_TRIPEND,
+    EVENT_TRIPMETRICS,
+    EVENT_TRIPSTART,
+    STORAGE_VERSION,
+    VEHICLES_COORDINATOR,
+    WEBHOOK_FRESHNESS,
+    WEBHOOK_QUEUE,
+)
+from custom_components.bouncie.models import VehicleStats
+
+from .const import MOCK_VEHICLE
+from .fake_bouncie import FakeBouncie, WebhookEmitter, load_drive
+
+
+def test_parse_webhook() -> None:
+    """Test webhook bodies are parsed and required keys coerced."""
+    status = parse_webhook(
+        b'{"eventType": "tripStart", "imei": 123, "vin": "ABC", "extra": 1}'
+    )
+    assert status == {"eventType": "tripStart", "imei": "123", "vin": "ABC", "extra": 1}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"not json", b"[]", b'{"eventType": "tripStart", "imei": "123"}'],
+)
+def test_parse_webhook_invalid(body: bytes) -> None:
+    """Test invalid webhook bodies are rejected."""
+    with pytest.raises(ValueError):
+        parse_webhook(body)
+
+
+async def test_replay_drive(
+    hass: HomeAssistant, hass_client_no_auth, setup_entry
+) -> None:
+    """Test a recorded drive updates the vehicle with the API served locally."""
+    server = FakeBouncie()
+    await server.async_start()
+    assert await async_setup_component(hass, "http", {})
+    with server.patch_urls():
+        entry = await setup_entry()
+
+        emitter = WebhookEmitter(
+            await hass_client_no_auth(),
+            URL_WEBHOOK_PATH.format(webhook_id=entry.data[CONF_WEBHOOK_ID]),
+        )
+        await emitter.async_replay(load_drive(), server.vehicles[0])
+        entry_data = hass.data[DOMAIN][entry.entry_id]
+        queue = entry_data[WEBHOOK_QUEUE]
+        while queue.processed < queue.enqueued:
+            await asyncio.sleep(0.01)
+        await hass.async_block_till_done()
+
+    assert emitter.sent == len(load_drive())
+    coordinator = entry_data[VEHICLES_COORDINATOR]
+    stats = coordinator.data[server.vehicles[0][ATTR_VIN]].stats
+    assert stats.odometer == 123457.5
+    assert stats.speed == 0
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await server.async_stop()
+
+
+async def test_poll_notifies_changed_vehicles(
+    hass: HomeAssistant, socket_enabled, setup_entry
+) -> None:
+    """Test a poll only notifies the vehicles whose record changed."""
+    server = FakeBouncie(fleet_size=2)
+    await server.async_start()
+    assert await async_setup_component(hass, "http", {})
+    with server.patch_urls():
+        entry = await setup_entry()
+        coordinator = hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR]
+        coordinator.api.scheduler.poll_spacing = 0
+        updated: list[str] = []
+        for vehicle in server.vehicles:
+            coordinator.async_add_vin_listener(
+                vehicle[ATTR_VIN], partial(updated.append, vehicle[ATTR_VIN])
+            )
+        data = coordinator.data
+
+        await coordinator.async_refresh()
+        assert coordinator.data is data
+        assert not updated
+
+        server.vehicles[1]["stats"]["speed"] = 0
+        await coordinator.async_refresh()
+        assert updated == [server.vehicles[1][ATTR_VIN]]
+        assert (
+            coordinator.data[server.vehicles[0][ATTR_VIN]]
+            is data[server.vehicles[0][ATTR_VIN]]
+        )
+        assert coordinator.data[server.vehicles[1][ATTR_VIN]].stats.speed == 0
+
+    assert server.requests[("/v1/vehicles", HTTPStatus.NOT_MODIFIED)] == 1
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await server.async_stop()
+
+
+async def test_setup_from_snapshot(
+    hass: HomeAssistant, hass_storage, bypass_get_vehicles, setup_entry
+) -> None:
+    """Test entities start from the stored vehicles while the API is unreachable."""
+    key = f"{DOMAIN}.snapshot.vehicles"
+    hass_storage[key] = {"version": STORAGE_VERSION, "key": key, "data": [MOCK_VEHICLE]}
+    bypass_get_vehicles.side_effect = ClientError
+    entry = await setup_entry(entry_id="snapshot")
+
+    # The refresh in the background failed, the snapshot is kept
+    assert bypass_get_vehicles.call_count == 1
+    coordinator = hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR]
+    assert not coordinator.last_update_success
+    assert coordinator.data[MOCK_VEHICLE[ATTR_VIN]].stats.odometer == 123456.789
+    assert hass.states.get("sensor.spam_eggs_odometer").state == "123456.79"
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+
+
+async def test_patch_newest_value_wins(
+    hass: HomeAssistant, bypass_get_vehicles, setup_entry
+) -> None:
+    """Test webhook and polled values are kept per field by their time."""
+    polled = deepcopy(MOCK_VEHICLE)
+    bypass_get_vehicles.side_effect = lambda: [deepcopy(polled)]
+    entry = await setup_entry()
+    coordinator = hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR]
+    coordinator.api.scheduler.poll_spacing = 0
+
+    def stats() -> VehicleStats:
+        return coordinator.data[MOCK_VEHICLE[ATTR_VIN]].stats
+
+    def _trip_event(event_type: str, section: str, time: str, odometer: float) -> None:
+        coordinator.dispatcher.async_handle_webhook(
+            {
+                ATTR_EVENT: event_type,
+                ATTR_VIN: MOCK_VEHICLE[ATTR_VIN],
+                ATTR_IMEI: MOCK_VEHICLE[ATTR_IMEI],
+                section: {"timestamp": time, "odometer": odometer},
+            }
+        )
+
+    # The vehicle was polled at 12:00, an older webhook value is ignored
+    _trip_event(EVENT_TRIPSTART, "start", "2022-01-01T11:00:00.000Z", 1.0)
+    assert stats().odometer == 123456.789
+    _trip_event(EVENT_TRIPEND, "end", "2022-01-01T12:05:00.000Z", 123460.0)
+    assert stats().odometer == 123460.0
+
+    # A poll older than the webhook only updates the other fields
+    polled["stats"].update(
+        lastUpdated="2022-01-01T12:02:00.000Z", odometer=123458.0, fuelLevel=90.0
+    )
+    await coordinator.async_refresh()
+    assert stats().odometer == 123460.0
+    assert stats().fuel_level == 90.0
+
+    # A newer poll replaces the webhook value
+    polled["stats"].update(lastUpdated="2022-01-01T12:10:00.000Z", odometer=123461.0)
+    await coordinator.async_refresh()
+    assert stats().odometer == 123461.0
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+
+
+@pytest.mark.usefixtures("bypass_get_vehicles")
+async def test_poll_interval_adapts(hass: HomeAssistant, setup_entry) -> None:
+    """Test polling backs off, pauses while webhooks arrive and resumes after."""
+    now = 1000.0
+    with patch("custom_components.bouncie.common.monotonic", side_effect=lambda: now):
+        entry = await setup_entry(options={CONF_COALESCE_WINDOW: 0})
+        coordinator = hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR]
+        coordinator.api.scheduler.poll_spacing = 0
+
+        def _event(event_type: str) -> None:
+            coordinator.dispatcher.async_handle_webhook(
+                {
+                    ATTR_EVENT: event_type,
+                    ATTR_VIN: MOCK_VEHICLE[ATTR_VIN],
+                    ATTR_IMEI: MOCK_VEHICLE[ATTR_IMEI],
+                }
+            )
+
+        # Polls without webhooks back off up to the ceiling
+        for _ in range(8):
+            await coordinator.async_refresh()
+        assert coordinator.update_interval == coordinator.poll_ceiling
+
+        # A trip polls at the floor until its data arrives by webhook
+        _event(EVENT_TRIPSTART)
+        assert coordinator.has_active_trips()
+        assert coordinator.update_interval == coordinator.poll_floor
+        _event(EVENT_TRIPMETRICS)
+        assert coordinator.update_interval is None
+
+        # The trip went quiet without a tripEnd, polling resumes at the floor
+        now += WEBHOOK_FRESHNESS.total_seconds()
+        coordinator._async_adapt_interval()  # pylint: disable=protected-access
+        assert not coordinator.has_active_trips()
+        assert coordinator.update_interval == coordinator.poll_floor
+
+        # The next trip ends normally
+        _event(EVENT_TRIPSTART)
+        _event(EVENT_TRIPEND)
+        assert not coordinator.has_active_trips()
+        assert coordinator.update_interval is None
+
+        assert await hass.config_entries.async_unload(entry.entry_id)
@@ -5,9 +5,15 @@ from homeassistant import config_entries, data_entry_flow
 import pytest
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
-from custom_components.bouncie.const import DEVICE_TRACKER, DOMAIN, PLATFORMS, SENSOR
+from custom_components.bouncie.const import (
+    CONF_METRICS,
+    CONF_POLL_FLOOR,
+    CONF_QUEUE_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    DOMAIN,
+)
 
-from .const import MOCK_CONFIG
+from .const import MOCK_CONFIG, MOCK_ENTRY
 
 
 # This fixture bypasses the actual setup of the integration
@@ -76,25 +82,27 @@ async def test_options_flow(hass):
     """Test an options flow."""
     # Create a new MockConfigEntry and add to HASS (we're bypassing config
     # flow entirely)
-    entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    entry = MockConfigEntry(domain=DOMAIN, data=dict(MOCK_ENTRY.data), entry_id="test")
     entry.add_to_hass(hass)
 
     # Initialize an options flow
     result = await hass.config_entries.options.async_init(entry.entry_id)
 
-    # Verify that the first options step is a user form
+    # Verify that the first options step is a form
     assert result["type"] == data_entry_flow.RESULT_TYPE_FORM
-    assert result["step_id"] == "user"
+    assert result["step_id"] == "init"
 
     # Enter some fake data into the form
     result = await hass.config_entries.options.async_configure(
         result["flow_id"],
-        user_input={platform: platform != SENSOR for platform in PLATFORMS},
+        user_input={CONF_POLL_FLOOR: 10, CONF_METRICS: True},
     )
 
     # Verify that the flow finishes
     assert result["type"] == data_entry_flow.RESULT_TYPE_CREATE_ENTRY
-    assert result["title"] == "test_username"
+    assert result["title"] == ""
 
-    # Verify that the options were updated
-    assert entry.options == {BINARY_SENSOR: True, SENSOR: False, SWITCH: True}
+    # Verify that the options were updated, the others keep their defaults
+    assert entry.options[CONF_POLL_FLOOR] == 10
+    assert entry.options[CONF_METRICS] is True
+    assert entry.options[CONF_QUEUE_SIZE] == DEFAULT_QUEUE_SIZE
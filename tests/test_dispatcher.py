@@ -0,0 +1,217 @@
+"""Test bouncie webhook dispatcher."""
+import asyncio
+
+from homeassistant.core import Event, HomeAssistant
+
+from custom_components.bouncie.const import (
+    ATTR_DATA,
+    ATTR_ENTRY_ID,
+    ATTR_EVENT,
+    ATTR_VIN,
+    BOUNCIE_EVENT,
+    BUS_EVENTS_OFF,
+    BUS_EVENTS_SUMMARY,
+    EVENT_MIL,
+    EVENT_TRIPDATA,
+    EVENT_TRIPEND,
+    EVENT_TRIPSTART,
+    OVERFLOW_COALESCE,
+)
+from custom_components.bouncie.dispatcher import (
+    BouncieWebhookDispatcher,
+    BouncieWebhookQueue,
+)
+
+from .const import MOCK_ENTRY, MOCK_VEHICLE
+
+
+async def test_dispatch_by_vin_and_event(hass: HomeAssistant) -> None:
+    """Test events only reach subscribers of their VIN and event type."""
+    dispatcher = BouncieWebhookDispatcher(hass, MOCK_ENTRY.entry_id)
+    received = []
+    unsub = dispatcher.async_subscribe(
+        MOCK_VEHICLE[ATTR_VIN], (EVENT_TRIPDATA,), received.append
+    )
+    dispatcher.async_subscribe("OTHER", (EVENT_TRIPDATA,), received.append)
+
+    event = {
+        ATTR_EVENT: EVENT_TRIPDATA,
+        ATTR_VIN: MOCK_VEHICLE[ATTR_VIN],
+        ATTR_ENTRY_ID: MOCK_ENTRY.entry_id,
+    }
+    dispatcher.async_handle_webhook(event)
+    dispatcher.async_handle_webhook({**event, ATTR_EVENT: EVENT_TRIPEND})
+
+    assert received == [event]
+    assert dispatcher.dispatched == 1
+    # One subscriber not served by the trip data, both by the trip end
+    assert dispatcher.skipped == 3
+
+    unsub()
+    dispatcher.async_stop()
+
+
+async def test_dispatch_skips_per_subscriber(hass: HomeAssistant) -> None:
+    """Test a subscriber of several event types is counted once."""
+    dispatcher = BouncieWebhookDispatcher(hass, MOCK_ENTRY.entry_id)
+    received = []
+    dispatcher.async_subscribe(
+        MOCK_VEHICLE[ATTR_VIN],
+        (EVENT_TRIPSTART, EVENT_TRIPDATA, EVENT_TRIPEND),
+        received.append,
+    )
+    event = {ATTR_EVENT: EVENT_TRIPDATA, ATTR_VIN: MOCK_VEHICLE[ATTR_VIN]}
+    dispatcher.async_dispatch(event)
+    dispatcher.async_dispatch({**event, ATTR_EVENT: EVENT_MIL})
+
+    assert received == [event]
+    assert dispatcher.dispatched == 1
+    assert dispatcher.skipped == 1
+
+
+async def test_dispatch_bus_events(hass: HomeAssistant) -> None:
+    """Test the public event only carries a summary of the trip data."""
+    fired: list[Event] = []
+    hass.bus.async_listen(BOUNCIE_EVENT, fired.append)
+    event = {
+        ATTR_EVENT: EVENT_TRIPDATA,
+        ATTR_VIN: MOCK_VEHICLE[ATTR_VIN],
+        ATTR_ENTRY_ID: MOCK_ENTRY.entry_id,
+        ATTR_DATA: [
+            {"timestamp": "2022-01-01T12:00:00.000Z", "gps": {"lat": 1.0, "lon": 2.0}},
+            {"timestamp": "2022-01-01T12:00:01.000Z", "gps": {"lat": 1.1, "lon": 2.1}},
+        ],
+    }
+    BouncieWebhookDispatcher(
+        hass, MOCK_ENTRY.entry_id, bus_events=BUS_EVENTS_OFF
+    ).async_handle_webhook(event)
+    BouncieWebhookDispatcher(
+        hass, MOCK_ENTRY.entry_id, bus_events=BUS_EVENTS_SUMMARY
+    ).async_handle_webhook(event)
+    await hass.async_block_till_done()
+
+    assert [fired_event.data for fired_event in fired] == [
+        {
+            ATTR_ENTRY_ID: MOCK_ENTRY.entry_id,
+            ATTR_VIN: MOCK_VEHICLE[ATTR_VIN],
+            ATTR_EVENT: EVENT_TRIPDATA,
+            "timestamp": "2022-01-01T12:00:01+00:00",
+            "lat": 1.1,
+            "lon": 2.1,
+        }
+    ]
+
+
+async def test_dispatch_coalesce_window(hass: HomeAssistant) -> None:
+    """Test trip data is merged within the window and flushed by other events."""
+    dispatcher = BouncieWebhookDispatcher(hass, MOCK_ENTRY.entry_id, 60)
+    received = []
+    dispatcher.async_subscribe(
+        MOCK_VEHICLE[ATTR_VIN], (EVENT_TRIPDATA, EVENT_TRIPEND), received.append
+    )
+    event = {ATTR_EVENT: EVENT_TRIPDATA, ATTR_VIN: MOCK_VEHICLE[ATTR_VIN]}
+    first = {"timestamp": "2022-01-01T12:00:00.000Z", "speed": 10.0}
+    second = {"timestamp": "2022-01-01T12:00:01.000Z", "speed": 20.0}
+    dispatcher.async_dispatch({**event, ATTR_DATA: [first]})
+    dispatcher.async_dispatch({**event, ATTR_DATA: [second]})
+    assert not received
+    assert dispatcher.coalesced == 1
+
+    dispatcher.async_dispatch({**event, ATTR_EVENT: EVENT_TRIPEND})
+    assert received == [
+        {**event, ATTR_DATA: [first, second]},
+        {**event, ATTR_EVENT: EVENT_TRIPEND},
+    ]
+
+    dispatcher.async_dispatch({**event, ATTR_EVENT: EVENT_TRIPSTART})
+    dispatcher.async_dispatch({**event, ATTR_DATA: []})
+    dispatcher.async_stop()
+    assert received[-1] == {**event, ATTR_DATA: []}
+    assert dispatcher.trip_buffer[MOCK_VEHICLE[ATTR_VIN]].last_speed is None
+
+
+async def test_dispatch_rejects_repeated_events(hass: HomeAssistant) -> None:
+    """Test retried and outdated events are not delivered."""
+    dispatcher = BouncieWebhookDispatcher(hass, MOCK_ENTRY.entry_id)
+    received = []
+    dispatcher.async_subscribe(
+        MOCK_VEHICLE[ATTR_VIN], (EVENT_MIL, EVENT_TRIPDATA), received.append
+    )
+
+    def _event(event_type: str, timestamp: str) -> dict:
+        section = {"timestamp": timestamp}
+        return {
+            ATTR_EVENT: event_type,
+            ATTR_VIN: MOCK_VEHICLE[ATTR_VIN],
+            "mil": section,
+            "start": section,
+            ATTR_DATA: [section],
+        }
+
+    dispatcher.async_dispatch(_event(EVENT_MIL, "2022-01-01T12:00:00.000Z"))
+    dispatcher.async_dispatch(_event(EVENT_MIL, "2022-01-01T12:00:00.000Z"))
+    dispatcher.async_dispatch(_event(EVENT_MIL, "2022-01-01T11:00:00.000Z"))
+    assert len(received) == 1
+    assert dispatcher.filter.duplicates == 1
+    assert dispatcher.filter.stale == 1
+
+    dispatcher.async_dispatch(_event(EVENT_TRIPSTART, "2022-01-01T12:00:00.000Z"))
+    # Late trip data of the current trip is delivered, of an older trip it is not
+    dispatcher.async_dispatch(_event(EVENT_TRIPDATA, "2022-01-01T12:00:02.000Z"))
+    dispatcher.async_dispatch(_event(EVENT_TRIPDATA, "2022-01-01T12:00:01.000Z"))
+    dispatcher.async_dispatch(_event(EVENT_TRIPDATA, "2022-01-01T11:59:00.000Z"))
+    assert len(received) == 3
+    assert dispatcher.filter.stale == 2
+
+
+async def test_queue_overflow_coalesce(hass: HomeAssistant) -> None:
+    """Test a full queue merges trip data of the same vehicle."""
+    handled = []
+    queue = BouncieWebhookQueue(hass, handled.append, 1, 1, OVERFLOW_COALESCE)
+    event = {ATTR_EVENT: EVENT_TRIPDATA, ATTR_VIN: MOCK_VEHICLE[ATTR_VIN]}
+    queue.async_put({**event, ATTR_DATA: [1]})
+    queue.async_put({**event, ATTR_DATA: [2]})
+    queue.async_put({**event, ATTR_EVENT: EVENT_TRIPEND})
+
+    assert queue.coalesced == 1
+    assert queue.dropped == 1
+
+    queue.async_start()
+    await asyncio.sleep(0)
+    await queue.async_stop()
+
+    assert handled == [{**event, ATTR_EVENT: EVENT_TRIPEND}]
+
+
+async def test_queue_overflow_coalesce_retry(hass: HomeAssistant) -> None:
+    """Test a retried webhook merged in a full queue adds no points twice."""
+    handled = []
+    queue = BouncieWebhookQueue(hass, handled.append, 1, 1, OVERFLOW_COALESCE)
+    event = {ATTR_EVENT: EVENT_TRIPDATA, ATTR_VIN: MOCK_VEHICLE[ATTR_VIN]}
+    first = {"timestamp": "2022-01-01T12:00:00.000Z", "speed": 10}
+    second = {"timestamp": "2022-01-01T12:00:05.000Z", "speed": 20}
+    queue.async_put({**event, ATTR_DATA: [first]})
+    queue.async_put({**event, ATTR_DATA: [first, second]})
+    queue.async_put({**event, ATTR_DATA: [first, second]})
+
+    assert queue.coalesced == 2
+
+    queue.async_start()
+    await queue.async_stop()
+
+    assert handled == [{**event, ATTR_DATA: [first, second]}]
+
+
+async def test_queue_stop_handles_queued(hass: HomeAssistant) -> None:
+    """Test webhooks still queued are handled when the queue stops."""
+    handled = []
+    queue = BouncieWebhookQueue(hass, handled.append, 10, 1, OVERFLOW_COALESCE)
+    queue.async_start()
+    event = {ATTR_EVENT: EVENT_TRIPSTART, ATTR_VIN: MOCK_VEHICLE[ATTR_VIN]}
+    queue.async_put(event)
+    queue.async_put({**event, ATTR_EVENT: EVENT_TRIPEND})
+    await queue.async_stop()
+
+    assert handled == [event, {**event, ATTR_EVENT: EVENT_TRIPEND}]
+    assert queue.processed == queue.enqueued == 2
+    assert queue.depth == 0
@@ -0,0 +1,39 @@
+"""Test bouncie entities."""
+from unittest.mock import MagicMock
+
+from custom_components.bouncie.models import VehicleState
+from custom_components.bouncie.sensor import BouncieOdometer, BouncieSpeedSensor
+
+from .const import MOCK_VEHICLE
+
+
+def _coordinator() -> MagicMock:
+    """Return a coordinator holding the mock vehicle."""
+    coordinator = MagicMock()
+    coordinator.data = {MOCK_VEHICLE["vin"]: VehicleState.from_dict(MOCK_VEHICLE)}
+    return coordinator
+
+
+def test_deadband_stop_is_written() -> None:
+    """Test a drop to zero within the deadband is not suppressed."""
+    sensor = BouncieSpeedSensor(_coordinator(), MOCK_VEHICLE["vin"])
+    sensor._speed = 0.3
+    sensor._last_snapshot = sensor._state_snapshot()
+
+    sensor._speed = 0.6
+    assert sensor._is_unchanged(sensor._state_snapshot())
+    sensor._speed = 0
+    assert not sensor._is_unchanged(sensor._state_snapshot())
+
+
+def test_deadband_step_is_written() -> None:
+    """Test a step of exactly the deadband is written despite float rounding."""
+    sensor = BouncieOdometer(_coordinator(), MOCK_VEHICLE["vin"])
+    sensor._odometer = 123456.78
+    sensor._last_snapshot = sensor._state_snapshot()
+
+    sensor._odometer = 123456.79
+    assert sensor.native_value - 123456.78 < 0.01
+    assert not sensor._is_unchanged(sensor._state_snapshot())
+    sensor._odometer = 123456.783
+    assert sensor._is_unchanged(sensor._state_snapshot())
@@ -1,13 +1,55 @@
 """Test bouncie init."""
+from datetime import timedelta
+import gc
+import os
+
 # from homeassistant import config_entries
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.config_entry_oauth2_flow import DATA_IMPLEMENTATIONS
 from homeassistant.setup import async_setup_component
+from homeassistant.util import dt
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.bouncie.common import (
+    SAVE_DELAY,
+    BouncieOAuth2Implementation,
+    BouncieVehiclesDataUpdateCoordinator,
+)
+from custom_components.bouncie.const import (
+    CONF_CLIENT_ID,
+    CONF_METRICS,
+    DOMAIN,
+    VEHICLES_COORDINATOR,
+)
+
+from .const import MOCK_CONFIG
+
+RELOADS = int(os.environ.get("BOUNCIE_RELOADS", "200"))
+
+
+def _count_coordinators() -> int:
+    """Return the number of coordinators still in memory."""
+    gc.collect()
+    return sum(
+        1
+        for obj in gc.get_objects()
+        if isinstance(obj, BouncieVehiclesDataUpdateCoordinator)
+    )
 
-from custom_components.bouncie.common import BouncieOAuth2Implementation
-from custom_components.bouncie.const import DOMAIN
 
-from .const import MOCK_CONFIG  # , MOCK_ENTRY
+async def _async_resources(hass: HomeAssistant) -> dict[str, int]:
+    """Return the counts of the resources an entry holds while loaded."""
+    # A delayed save listens for the final write until it is written
+    async_fire_time_changed(hass, dt.utcnow() + timedelta(seconds=SAVE_DELAY + 1))
+    await hass.async_block_till_done()
+    return {
+        "coordinators": _count_coordinators(),
+        "bus_listeners": sum(hass.bus.async_listeners().values()),
+        "entities": len(hass.states.async_all()),
+        "implementations": len(hass.data.get(DATA_IMPLEMENTATIONS, {}).get(DOMAIN, {})),
+        "webhooks": len(hass.data.get("webhook", {})),
+    }
 
 
 async def test_component_setup(hass: HomeAssistant) -> None:
@@ -48,3 +90,67 @@ async def test_component_setup(hass: HomeAssistant) -> None:
 #     assert await MOCK_ENTRY.async_unload(hass)
 #     await hass.async_block_till_done()
 #     assert MOCK_ENTRY.state == config_entries.ENTRY_STATE_NOT_LOADED
+
+
+@pytest.mark.usefixtures("bypass_get_vehicles")
+async def test_entry_reload_does_not_leak(hass: HomeAssistant, setup_entry) -> None:
+    """Test repeated reloads release everything the previous setup held."""
+    entry = await setup_entry(entry_id="reload")
+    baseline = await _async_resources(hass)
+    assert baseline["coordinators"] == 1
+    assert baseline["entities"] > 0
+
+    for _ in range(RELOADS):
+        assert await hass.config_entries.async_reload(entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert await _async_resources(hass) == baseline
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert _count_coordinators() == 0
+    assert entry.entry_id not in hass.data[DOMAIN]
+    assert entry.data[CONF_CLIENT_ID] not in hass.data[DATA_IMPLEMENTATIONS][DOMAIN]
+    assert not hass.data.get("webhook")
+
+
+@pytest.mark.usefixtures("bypass_get_vehicles")
+async def test_entry_reload_on_options_change(hass: HomeAssistant, setup_entry) -> None:
+    """Test the entry is reloaded when its options change, not its token."""
+    entry = await setup_entry(entry_id="options")
+    coordinator = hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR]
+
+    hass.config_entries.async_update_entry(
+        entry,
+        data={
+            **entry.data,
+            "token": {**entry.data["token"], "access_token": "new"},
+        },
+    )
+    await hass.async_block_till_done()
+    assert hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR] is coordinator
+
+    hass.config_entries.async_update_entry(entry, options={CONF_METRICS: True})
+    await hass.async_block_till_done()
+    assert hass.data[DOMAIN][entry.entry_id][VEHICLES_COORDINATOR] is not coordinator
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+
+@pytest.mark.usefixtures("bypass_get_vehicles")
+async def test_entry_remove_deletes_storage(
+    hass: HomeAssistant, hass_storage, setup_entry
+) -> None:
+    """Test removing an entry deletes its stored vehicles and trips."""
+    entry = await setup_entry(entry_id="remove")
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+    assert f"{DOMAIN}.remove.vehicles" in hass_storage
+
+    await hass.config_entries.async_remove(entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert f"{DOMAIN}.remove.vehicles" not in hass_storage
+    assert f"{DOMAIN}.remove.trips" not in hass_storage
@@ -0,0 +1,27 @@
+"""Test bouncie instrumentation."""
+from custom_components.bouncie.metrics import NO_METRICS, BouncieMetrics
+
+
+def test_metrics() -> None:
+    """Test counters and timings are recorded."""
+    metrics = BouncieMetrics()
+    metrics.increment("api_errors.http_429")
+    metrics.increment("api_errors.http_503", 2)
+    with metrics.time("dispatch"):
+        pass
+    metrics.observe("dispatch", 10.0)
+
+    assert metrics.total("api_errors.") == 3
+    timing = metrics.as_dict()["timings"]["dispatch"]
+    assert timing["count"] == 2
+    assert timing["max"] == 10.0
+    assert timing["buckets"]["+inf"] == 1
+
+
+def test_no_metrics() -> None:
+    """Test nothing is recorded while instrumentation is off."""
+    NO_METRICS.increment("webhooks")
+    with NO_METRICS.time("dispatch"):
+        pass
+
+    assert NO_METRICS.as_dict() == {"enabled": False, "counters": {}, "timings": {}}
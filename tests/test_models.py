@@ -0,0 +1,37 @@
+"""Test bouncie vehicle models."""
+from custom_components.bouncie.const import DOMAIN
+from custom_components.bouncie.models import VehicleLocation, VehicleState
+
+from .const import MOCK_VEHICLE
+
+
+def test_vehicle_state() -> None:
+    """Test a vehicle is parsed and stored in the format of the API."""
+    vehicle = VehicleState.from_dict(MOCK_VEHICLE)
+
+    assert vehicle.vin == MOCK_VEHICLE["vin"]
+    assert vehicle.stats.odometer == 123456.789
+    assert vehicle.stats.fuel_level == 98.76
+    assert vehicle.stats.location == VehicleLocation(1.2345, 6.789)
+    assert vehicle.stats.updated_at == 1641038400.0
+    assert vehicle.device_info is vehicle.device_info
+    assert vehicle.device_info["identifiers"] == {(DOMAIN, MOCK_VEHICLE["vin"])}
+
+    restored = VehicleState.from_dict(vehicle.as_dict())
+    assert restored.as_dict() == vehicle.as_dict()
+    assert restored.stats.last_updated == vehicle.stats.last_updated
+
+
+def test_vehicle_state_missing_fields() -> None:
+    """Test missing fields of a vehicle are parsed as unknown."""
+    vehicle = VehicleState.from_dict(
+        {"vin": MOCK_VEHICLE["vin"], "stats": {"location": {"lat": 1.2345}}}
+    )
+
+    assert vehicle.nickname == MOCK_VEHICLE["vin"]
+    assert vehicle.imei is None
+    assert vehicle.make is None
+    assert vehicle.stats.location is None
+    assert vehicle.stats.odometer is None
+    assert vehicle.stats.updated_at == 0.0
+    assert vehicle.as_dict()["stats"] == {}
@@ -0,0 +1,63 @@
+"""Test bouncie scheduler."""
+import asyncio
+from time import monotonic
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.bouncie.scheduler import BouncieScheduler, async_get_scheduler
+
+
+async def test_scheduler_priority(hass: HomeAssistant) -> None:
+    """Test entries with trips in progress are served first."""
+    scheduler = async_get_scheduler(hass)
+    assert async_get_scheduler(hass) is scheduler
+    scheduler.concurrency = 1
+    unsub_idle = scheduler.async_register("idle", lambda: False)
+    unsub_active = scheduler.async_register("active", lambda: True)
+    served: list[str] = []
+
+    async def _request(entry_id: str) -> None:
+        async with scheduler.async_request_slot(entry_id):
+            served.append(entry_id)
+            await asyncio.sleep(0)
+
+    async with scheduler.async_request_slot("idle"):
+        tasks = [
+            hass.async_create_task(_request(entry_id))
+            for entry_id in ("idle", "idle", "active")
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 3
+        # A cancelled request gives up its place in line
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks[1:])
+
+    assert served == ["active", "idle"]
+    assert scheduler.running == 0
+    unsub_idle()
+    unsub_active()
+    assert scheduler.entries == 0
+
+
+async def test_scheduler_stagger_polls(hass: HomeAssistant) -> None:
+    """Test polls of idle entries are spaced out, active entries do not wait."""
+    scheduler = BouncieScheduler(poll_spacing=0.05)
+    scheduler.async_register("active", lambda: True)
+    started: dict[str, float] = {}
+
+    async def _poll(name: str, entry_id: str) -> None:
+        await scheduler.async_wait_poll(entry_id)
+        started[name] = monotonic()
+
+    begin = monotonic()
+    await asyncio.gather(
+        _poll("first", "idle"),
+        _poll("second", "idle"),
+        _poll("third", "idle"),
+        _poll("active", "active"),
+    )
+
+    assert started["active"] - begin < 0.05
+    assert started["second"] - started["first"] >= 0.04
+    assert started["third"] - started["second"] >= 0.04
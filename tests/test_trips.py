@@ -0,0 +1,215 @@
+"""Test bouncie trip data handling."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt
+
+from custom_components.bouncie.const import (
+    ATTR_DATA,
+    ATTR_END_TIME,
+    ATTR_EVENT,
+    ATTR_IMEI,
+    ATTR_START_TIME,
+    ATTR_TRANSACTION_ID,
+    ATTR_VIN,
+    EVENT_TRIPDATA,
+    EVENT_TRIPEND,
+    EVENT_TRIPMETRICS,
+    EVENT_TRIPSTART,
+    TRIPS_BACKFILL,
+    TRIPS_SYNC_OVERLAP,
+)
+from custom_components.bouncie.trips import (
+    BouncieTripBuffer,
+    BouncieTripStore,
+    PathSimplifier,
+    TripAggregate,
+    TripColumns,
+    TripPoint,
+)
+
+from .const import MOCK_VEHICLE
+
+VIN = MOCK_VEHICLE[ATTR_VIN]
+IMEI = MOCK_VEHICLE[ATTR_IMEI]
+
+
+def _trip_data(*points: tuple[str, float, float | None]) -> dict:
+    """Return a trip data event for (timestamp, speed, fuel) points."""
+    return {
+        ATTR_EVENT: EVENT_TRIPDATA,
+        ATTR_VIN: VIN,
+        ATTR_DATA: [
+            {
+                "timestamp": timestamp,
+                "speed": speed,
+                "gps": {"lat": speed, "lon": -speed},
+                **({"fuelLevelInput": fuel} if fuel is not None else {}),
+            }
+            for timestamp, speed, fuel in points
+        ],
+    }
+
+
+def test_trip_buffer_ingest() -> None:
+    """Test trip data points are buffered in time order."""
+    buffer = BouncieTripBuffer()
+    buffer.async_ingest(
+        _trip_data(
+            ("2022-01-01T12:00:02.000Z", 30.0, None),
+            ("2022-01-01T12:00:01.000Z", 20.0, 55.0),
+        )
+    )
+    # Late delivery of an older batch
+    buffer.async_ingest(_trip_data(("2022-01-01T12:00:00.000Z", 10.0, 60.0)))
+
+    trip = buffer[VIN]
+    assert list(trip.speed) == [10.0, 20.0, 30.0]
+    assert trip.last_speed == 30.0
+    assert trip.last_position == (30.0, -30.0)
+    assert trip.last_fuel == 55.0
+    assert trip.max_speed == 30.0
+    assert trip.average_speed == 20.0
+    assert len(trip.path()) == 3
+
+    buffer.async_ingest({ATTR_EVENT: EVENT_TRIPSTART, ATTR_VIN: VIN})
+    assert VIN not in buffer
+
+
+def test_path_simplifier() -> None:
+    """Test only points that change the extrapolated path are kept."""
+    simplifier = PathSimplifier(tolerance=5, max_gap=60)
+    trip = TripColumns()
+    kept = []
+    # Straight north for 10 seconds, then east, then a long stop
+    points = [
+        TripPoint(second, second / 10000, 0.0, 40.0, 50.0) for second in range(10)
+    ]
+    points += [
+        TripPoint(10 + second, 0.0009, second / 10000, 40.0, 50.0)
+        for second in range(1, 5)
+    ]
+    points.append(TripPoint(100, 0.0009, 0.0004, 0.0, 50.0))
+    for point in points:
+        trip.simplify([point], simplifier)
+        if trip.path_last is point:
+            kept.append(point.timestamp)
+
+    assert kept == [0, 1, 11, 12, 100]
+
+
+def test_trip_aggregate() -> None:
+    """Test trip totals are accumulated and final once the trip ends."""
+    buffer = BouncieTripBuffer()
+    buffer.async_ingest(
+        {
+            ATTR_EVENT: EVENT_TRIPSTART,
+            ATTR_VIN: VIN,
+            "start": {"timestamp": "2022-01-01T12:00:00.000Z", "odometer": 100.0},
+        }
+    )
+    buffer.async_ingest(
+        _trip_data(
+            ("2022-01-01T12:00:00.000Z", 0.0, 60.0),
+            ("2022-01-01T12:00:30.000Z", 20.0, None),
+            ("2022-01-01T12:01:00.000Z", 40.0, 59.0),
+        )
+    )
+    trip = buffer.aggregates[VIN]
+    assert trip.max_speed == 40.0
+    assert trip.average_speed == 20.0
+    assert trip.idle_time == 30.0
+    assert trip.fuel_used == 1.0
+    assert trip.distance > 0
+
+    buffer.async_ingest(
+        {
+            ATTR_EVENT: EVENT_TRIPMETRICS,
+            ATTR_VIN: VIN,
+            "metrics": {
+                "timestamp": "2022-01-01T12:01:00.000Z",
+                "hardBrakingCounts": 2,
+            },
+        }
+    )
+    buffer.async_ingest(
+        {
+            ATTR_EVENT: EVENT_TRIPEND,
+            ATTR_VIN: VIN,
+            "end": {"timestamp": "2022-01-01T12:02:00.000Z", "odometer": 101.5},
+        }
+    )
+    # Late data does not change the final totals
+    buffer.async_ingest(_trip_data(("2022-01-01T12:01:30.000Z", 80.0, 50.0)))
+
+    assert trip.finished
+    assert trip.distance == 1.5
+    assert trip.duration == 120.0
+    assert trip.max_speed == 40.0
+    assert trip.hard_brakes == 2
+    assert TripAggregate.from_dict(trip.as_dict()).as_dict() == trip.as_dict()
+
+
+def test_trip_aggregate_out_of_order() -> None:
+    """Test points older than the newest point do not change the totals."""
+    buffer = BouncieTripBuffer()
+    buffer.async_ingest(
+        {
+            ATTR_EVENT: EVENT_TRIPSTART,
+            ATTR_VIN: VIN,
+            "start": {"timestamp": "2022-01-01T12:00:00.000Z", "odometer": 100.0},
+        }
+    )
+    buffer.async_ingest(
+        _trip_data(
+            ("2022-01-01T12:00:00.000Z", 0.0, 60.0),
+            ("2022-01-01T12:01:00.000Z", 40.0, 59.0),
+        )
+    )
+    trip = buffer.aggregates[VIN]
+    totals = trip.as_dict()
+
+    # A batch that arrived late and a retried batch
+    buffer.async_ingest(_trip_data(("2022-01-01T12:00:30.000Z", 90.0, 65.0)))
+    buffer.async_ingest(_trip_data(("2022-01-01T12:01:00.000Z", 40.0, 59.0)))
+
+    assert trip.as_dict() == totals
+    assert trip.max_speed == 40.0
+    assert trip.average_speed == 20.0
+    assert trip.fuel_used == 1.0
+
+
+async def test_trip_store_sync_resumes(hass: HomeAssistant) -> None:
+    """Test a sync starts where the last one stopped and only saves changes."""
+    starts: list[datetime] = []
+    trip_end = dt.utcnow() - timedelta(hours=1)
+    trip = {
+        ATTR_TRANSACTION_ID: "trip-1",
+        ATTR_START_TIME: (trip_end - timedelta(minutes=30)).isoformat(),
+        ATTR_END_TIME: trip_end.isoformat(),
+    }
+
+    async def _iter_trips(imei: str, start: datetime, end: datetime):
+        starts.append(start)
+        # A window that ends while the trip could still be ongoing
+        yield trip_end + TRIPS_SYNC_OVERLAP, [trip]
+
+    api = MagicMock()
+    api.async_iter_trips = _iter_trips
+    store = BouncieTripStore(hass, "test", api)
+
+    await store.async_sync(IMEI)
+    assert starts[0] < dt.utcnow() - TRIPS_BACKFILL + timedelta(minutes=1)
+    assert store.trips(IMEI) == [trip]
+    assert (synced := store.synced(IMEI)) == trip_end.isoformat()
+    await store.async_flush()
+
+    await store.async_sync(IMEI)
+    assert starts[1] == dt.parse_datetime(synced)
+    assert store.trips(IMEI) == [trip]
+    # Neither the trips nor the cursor changed
+    assert store.synced(IMEI) == synced
+    assert not store._save_pending  # pylint: disable=protected-access